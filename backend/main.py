@@ -1,12 +1,22 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
-import aiofiles
+import asyncio
+import io
 import os
+import tarfile
+import time
+import zipfile
 from datetime import datetime
+from typing import List
 
 from backend.models.plant_model import PlantRecognitionModel
+from backend.models.inference_executor import InferenceExecutor, InferenceQueueFull
+from backend.models.result_cache import ResultCache
+from backend.models.metrics import MetricsRegistry
+from backend.models.vector_index import INDEX_FILE, VectorIndex
+from backend.upload import ImageUpload, UploadRejected, read_image_upload
 
 # 初始化应用
 app = FastAPI(
@@ -26,8 +36,141 @@ app.add_middleware(
 
 # 全局变量
 plant_model = None
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+metrics = MetricsRegistry()
+# pre-fork 模式下由父进程预先加载并放入共享内存的 BryoFormer（见 backend/serve.py）
+preloaded_model = None
+
+# 模型权重路径（*.weights.pt 为可内存映射的快速格式，见 backend/tools/convert_weights.py）
+MODEL_PATH = os.getenv("PLANT_MODEL_PATH", "models/weights/best_plant_model.pth")
+
+# 动态批处理配置
+BATCH_MAX_SIZE = int(os.getenv("PLANT_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("PLANT_BATCH_MAX_WAIT_MS", "5"))
+
+# 推理后端：torch 或 onnx
+INFERENCE_BACKEND = os.getenv("PLANT_BACKEND", "torch")
+ONNX_MODEL_PATH = os.getenv("PLANT_ONNX_PATH", "models/weights/bryoformer.onnx")
+
+# 编译模式（torchscript / compile，留空为 eager）与启动预热批大小
+COMPILE_MODE = os.getenv("PLANT_COMPILE_MODE") or None
+WARMUP_BATCH_SIZES = sorted({int(size) for size in os.getenv(
+    "PLANT_WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",") if size.strip()})
+
+# 推理期算子融合（BatchNorm 折叠，数值等价）
+FUSE = os.getenv("PLANT_FUSE", "1") == "1"
+
+# 频域滤波实现：fft / conv / auto（启动时实测选择）
+SPECTRAL_STRATEGY = os.getenv("PLANT_SPECTRAL_STRATEGY", "fft")
+
+# channels_last 内存布局与 bfloat16 自动混合精度（需 AVX-512 / AMX）
+CHANNELS_LAST = os.getenv("PLANT_CHANNELS_LAST", "0") == "1"
+BF16 = os.getenv("PLANT_BF16", "0") == "1"
+
+# 快速预处理（JPEG draft 模式缩小解码）
+FAST_PREPROCESS = os.getenv("PLANT_FAST_PREPROCESS", "0") == "1"
+
+# 早退推理：辅助头权重（由 backend/tools/early_exit.py 训练）与置信度阈值（0 表示关闭，可通过 /debug/early-exit 调整）
+EXIT_HEADS_PATH = os.getenv("PLANT_EXIT_HEADS", "models/weights/exit_heads.pth")
+EARLY_EXIT_THRESHOLD = float(os.getenv("PLANT_EARLY_EXIT_THRESHOLD", "0"))
+
+# int8 动态量化（仅 CPU）
+QUANTIZE = os.getenv("PLANT_QUANTIZE", "0") == "1"
+
+# 推理执行器配置
+INFERENCE_WORKERS = int(os.getenv("PLANT_INFERENCE_WORKERS", "1"))
+TORCH_THREADS = int(os.getenv("PLANT_TORCH_THREADS", "0"))
+MAX_IN_FLIGHT = int(os.getenv("PLANT_MAX_IN_FLIGHT", "0"))
+MAX_QUEUE_DEPTH = int(os.getenv("PLANT_MAX_QUEUE_DEPTH", "64"))
+
+# 预处理阶段线程数（0 表示与前向推理共用推理执行器）与批处理队列上限
+PREPROCESS_WORKERS = int(os.getenv("PLANT_PREPROCESS_WORKERS", "2"))
+BATCH_QUEUE_SIZE = int(os.getenv("PLANT_BATCH_QUEUE_SIZE", "64"))
+
+# 预分配输入张量池的单图缓冲区数量（0 表示关闭）
+TENSOR_POOL_SIZE = int(os.getenv("PLANT_TENSOR_POOL_SIZE", "32"))
+
+# 结果缓存配置（条目数为 0 时关闭）
+CACHE_MAX_ENTRIES = int(os.getenv("PLANT_CACHE_MAX_ENTRIES", "1024"))
+CACHE_MAX_BYTES = int(os.getenv("PLANT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+CACHE_TTL_SECONDS = float(os.getenv("PLANT_CACHE_TTL_SECONDS", "3600"))
+
+# 上传限制：单张图片字节数与像素数（宽 x 高）上限
+UPLOAD_MAX_BYTES = int(os.getenv("PLANT_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_MAX_PIXELS = int(os.getenv("PLANT_UPLOAD_MAX_PIXELS", "64000000"))
+
+# 服务指标（/metrics，Prometheus 文本格式）
+REQUESTS_TOTAL = metrics.counter(
+    "plant_http_requests_total", "HTTP 请求数", ["method", "path", "status"])
+REQUEST_SECONDS = metrics.histogram(
+    "plant_http_request_seconds", "HTTP 请求总耗时（秒）", ["path"])
+PHASE_SECONDS = metrics.histogram(
+    "plant_phase_seconds", "各处理阶段耗时（秒）", ["phase"])
+MODEL_LOAD_SECONDS = metrics.gauge("plant_model_load_seconds", "模型加载耗时（秒）")
+MODEL_WARMUP_SECONDS = metrics.gauge("plant_model_warmup_seconds", "模型预热耗时（秒）")
+MODEL_LOADED = metrics.gauge("plant_model_loaded", "模型是否已加载")
+QUEUE_DEPTH = metrics.gauge("plant_queue_depth", "各阶段当前排队数", ["stage"])
+CACHE_EVENTS = metrics.counter("plant_cache_events_total", "结果缓存命中、未命中与淘汰次数", ["event"])
+CACHE_HIT_RATE = metrics.gauge("plant_cache_hit_rate", "结果缓存命中率")
+
+# 参考图片向量索引目录（由 backend/tools/build_index.py 生成），不存在时不提供相似图片
+REFERENCE_INDEX_PATH = os.getenv("PLANT_REFERENCE_INDEX", "models/weights/reference_index")
+SIMILAR_MAX = int(os.getenv("PLANT_SIMILAR_MAX", "20"))
+
+# 调试端点（/debug/*）默认关闭
+DEBUG_ENDPOINTS = os.getenv("PLANT_DEBUG_ENDPOINTS", "0") == "1"
+
+# 批量识别配置
+BATCH_MAX_FILES = int(os.getenv("PLANT_BATCH_MAX_FILES", "500"))
+# 单次批量请求的图片总字节数上限（直接上传与压缩包解压后合计，单张图片仍受 UPLOAD_MAX_BYTES 限制）
+BATCH_MAX_BYTES = int(os.getenv("PLANT_BATCH_MAX_BYTES", str(256 * 1024 * 1024)))
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp", ".tif", ".tiff"}
+
+
+def load_reference_index():
+    """以内存映射方式加载参考图片索引，未生成索引时返回 None"""
+    if not REFERENCE_INDEX_PATH or not os.path.exists(os.path.join(REFERENCE_INDEX_PATH, INDEX_FILE)):
+        return None
+    index = VectorIndex.load(REFERENCE_INDEX_PATH, mmap=True)
+    print(f"🗂️  已加载参考图片索引: {index.count} 张")
+    return index
+
+
+def create_plant_model(model=None, compile_mode=COMPILE_MODE):
+    """按环境变量配置创建识别模型；model 非空时复用已加载的 BryoFormer"""
+    return PlantRecognitionModel(
+        model_path=MODEL_PATH,
+        num_classes=44,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_batch_wait_ms=BATCH_MAX_WAIT_MS,
+        quantize=QUANTIZE,
+        backend=INFERENCE_BACKEND,
+        onnx_path=ONNX_MODEL_PATH,
+        compile_mode=compile_mode,
+        fuse=FUSE,
+        spectral_strategy=SPECTRAL_STRATEGY,
+        channels_last=CHANNELS_LAST,
+        bf16=BF16,
+        fast_preprocess=FAST_PREPROCESS,
+        preprocess_workers=PREPROCESS_WORKERS,
+        max_batch_queue=BATCH_QUEUE_SIZE,
+        tensor_pool_size=TENSOR_POOL_SIZE,
+        executor=InferenceExecutor(
+            max_workers=INFERENCE_WORKERS,
+            intra_op_threads=TORCH_THREADS,
+            max_in_flight=MAX_IN_FLIGHT,
+            max_queue_depth=MAX_QUEUE_DEPTH
+        ),
+        cache=ResultCache(
+            max_entries=CACHE_MAX_ENTRIES,
+            max_bytes=CACHE_MAX_BYTES,
+            ttl_seconds=CACHE_TTL_SECONDS
+        ),
+        model=model,
+        metrics=metrics,
+        reference_index=load_reference_index(),
+        exit_heads_path=EXIT_HEADS_PATH,
+        exit_threshold=EARLY_EXIT_THRESHOLD
+    )
 
 
 @app.on_event("startup")
@@ -35,10 +178,13 @@ async def startup_event():
     """启动时加载模型"""
     global plant_model
     try:
-        plant_model = PlantRecognitionModel(
-            model_path="models/weights/best_plant_model.pth",
-            num_classes=44
-        )
+        begin = time.perf_counter()
+        plant_model = create_plant_model(preloaded_model)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - begin)
+        # 预热：提前完成编译与内存分配，避免首个用户请求承担这部分开销
+        begin = time.perf_counter()
+        plant_model.warmup(WARMUP_BATCH_SIZES)
+        MODEL_WARMUP_SECONDS.set(time.perf_counter() - begin)
         print("🎉 植物识别模型加载成功！")
         print("🌐 API服务已启动: http://localhost:8000")
         print("📚 API文档: http://localhost:8000/docs")
@@ -47,6 +193,41 @@ async def startup_event():
         plant_model = None
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """关闭时停止批处理调度器、预处理阶段和推理执行器"""
+    if plant_model is not None:
+        if plant_model.batch_scheduler is not None:
+            await plant_model.batch_scheduler.close()
+        if plant_model.preprocess_stage is not None:
+            plant_model.preprocess_stage.shutdown()
+        plant_model.executor.shutdown()
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """按路由模板统计请求数与总耗时（避免 /api/plants/{plant_name} 等路径参数导致标签过多）"""
+    begin = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUESTS_TOTAL.inc(method=request.method, path=path, status=status)
+        REQUEST_SECONDS.observe(time.perf_counter() - begin, path=path)
+
+
+def serialize(payload):
+    """序列化 JSON 响应并记录耗时"""
+    begin = time.perf_counter()
+    response = JSONResponse(payload)
+    PHASE_SECONDS.observe(time.perf_counter() - begin, phase="serialization")
+    return response
+
+
 @app.get("/")
 async def root():
     return {
@@ -63,42 +244,133 @@ async def health_check():
     return {
         "status": "healthy",
         "model_loaded": plant_model is not None,
+        "inference": plant_model.executor.stats() if plant_model is not None else None,
+        "pipeline": plant_model.pipeline_stats() if plant_model is not None else None,
+        "cache": plant_model.cache.stats() if plant_model is not None and plant_model.cache is not None else None,
+        "early_exit": plant_model.early_exit_stats() if plant_model is not None else None,
         "timestamp": datetime.now().isoformat()
     }
 
 
-@app.post("/api/identify")
-async def identify_plant(file: UploadFile = File(...)):
-    """植物识别端点"""
+@app.get("/metrics", response_class=PlainTextResponse)
+async def export_metrics():
+    """Prometheus 指标：请求数、分阶段延迟直方图、批大小分布、缓存命中率与模型加载耗时"""
+    MODEL_LOADED.set(1 if plant_model is not None else 0)
+    if plant_model is not None:
+        pipeline = plant_model.pipeline_stats()
+        QUEUE_DEPTH.set(pipeline["inference"]["queued"], stage="inference")
+        if pipeline["preprocess"] is not None:
+            QUEUE_DEPTH.set(pipeline["preprocess"]["queued"], stage="preprocess")
+        if pipeline["batching"] is not None:
+            QUEUE_DEPTH.set(pipeline["batching"]["queue_depth"], stage="batching")
+        if plant_model.cache is not None:
+            cache_stats = plant_model.cache.stats()
+            for event in ("hits", "misses", "evictions"):
+                CACHE_EVENTS.set(cache_stats[event], event=event)
+            CACHE_HIT_RATE.set(cache_stats["hit_rate"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def require_debug_model():
+    if not DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
     if plant_model is None:
         raise HTTPException(status_code=503, detail="模型未加载，请检查服务状态")
+    return plant_model
 
-    if not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="请上传图片文件 (JPEG, PNG等)")
 
+@app.post("/debug/profile")
+async def start_profile(forwards: int = 20):
+    """对接下来 forwards 次模型前向开启逐层性能剖析，窗口结束后钩子自动卸载"""
+    model = require_debug_model()
     try:
-        # 保存上传的文件
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_extension = os.path.splitext(file.filename)[1]
-        file_path = os.path.join(UPLOAD_DIR, f"temp_{timestamp}{file_extension}")
+        model.start_profiling(forwards)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"🔬 开启逐层性能剖析: {forwards} 次前向")
+    return model.profile_report()
 
-        async with aiofiles.open(file_path, 'wb') as buffer:
-            content = await file.read()
-            await buffer.write(content)
 
-        print(f"📸 处理图片: {file.filename}")
+@app.get("/debug/profile")
+async def get_profile():
+    """当前采样窗口的逐层耗时、FLOPs 估算与激活内存"""
+    model = require_debug_model()
+    report = model.profile_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="尚未开启性能剖析")
+    return report
 
-        # 调用模型识别
-        result = await plant_model.predict(file_path)
 
-        # 清理临时文件
-        os.remove(file_path)
+@app.delete("/debug/profile")
+async def stop_profile():
+    model = require_debug_model()
+    model.stop_profiling()
+    return model.profile_report()
+
+
+@app.get("/debug/early-exit")
+async def get_early_exit():
+    """早退阈值、辅助头位置与各退出位置的样本占比"""
+    return require_debug_model().early_exit_stats()
+
+
+@app.put("/debug/early-exit")
+async def set_early_exit(threshold: float):
+    """运行时调整早退置信度阈值（0 表示关闭）"""
+    model = require_debug_model()
+    try:
+        model.set_exit_threshold(threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"🚪 早退置信度阈值: {threshold}")
+    return model.early_exit_stats()
+
+
+# 请求体由 read_image_upload 流式解析，这里手动声明表单结构供 API 文档使用
+IDENTIFY_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}}
+                }
+            }
+        }
+    }
+}
+
+
+@app.post("/api/identify", openapi_extra=IDENTIFY_REQUEST_BODY)
+async def identify_plant(request: Request, similar: int = 0):
+    """植物识别端点（similar > 0 时附带视觉相似的参考照片）"""
+    if plant_model is None:
+        raise HTTPException(status_code=503, detail="模型未加载，请检查服务状态")
+
+    # 边接收边校验：非图片、超过字节或像素上限的上传在读完请求体之前即被拒绝
+    try:
+        begin = time.perf_counter()
+        filename, content = await read_image_upload(
+            request, max_bytes=UPLOAD_MAX_BYTES, max_pixels=UPLOAD_MAX_PIXELS
+        )
+        PHASE_SECONDS.observe(time.perf_counter() - begin, phase="upload")
+    except UploadRejected as e:
+        print(f"🚫 拒绝上传: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        print(f"📸 处理图片: {filename}")
+
+        # 调用模型识别
+        result = await plant_model.predict(content, similar=max(0, min(similar, SIMILAR_MAX)))
 
         if result["success"] and result["predictions"]:
             top_plant = result["top_prediction"]
             print(f"✅ 识别成功: {top_plant['name']} (置信度: {top_plant['confidence']:.2%})")
 
-            return {
+            response = {
                 "success": True,
                 "identification": {
                     "top_prediction": top_plant,
@@ -107,20 +379,197 @@ async def identify_plant(file: UploadFile = File(...)):
                 "message": f"识别成功: {top_plant['name']}",
                 "timestamp": datetime.now().isoformat()
             }
+            if "similar_references" in result:
+                response["similar_references"] = result["similar_references"]
+            return serialize(response)
         else:
-            return {
+            return serialize({
                 "success": False,
                 "message": "识别失败，请尝试其他图片",
                 "error": result.get("error", "未知错误")
-            }
+            })
 
+    except InferenceQueueFull as e:
+        print(f"⏳ 推理队列已满: {e}")
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
     except Exception as e:
-        if 'file_path' in locals() and os.path.exists(file_path):
-            os.remove(file_path)
         print(f"❌ 识别过程出错: {e}")
         raise HTTPException(status_code=500, detail=f"识别过程出错: {str(e)}")
 
 
+@app.post("/api/embed", openapi_extra=IDENTIFY_REQUEST_BODY)
+async def embed_image(request: Request):
+    """提取图像特征向量（BryoFormer head 之前的 384 维池化特征，已 L2 归一化）"""
+    if plant_model is None:
+        raise HTTPException(status_code=503, detail="模型未加载，请检查服务状态")
+    if not plant_model.supports_embeddings:
+        raise HTTPException(status_code=400, detail="当前推理后端不支持特征提取")
+
+    try:
+        _, content = await read_image_upload(request, max_bytes=UPLOAD_MAX_BYTES, max_pixels=UPLOAD_MAX_PIXELS)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    try:
+        embedding = await plant_model.embed(content)
+    except InferenceQueueFull as e:
+        print(f"⏳ 推理队列已满: {e}")
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+    except Exception as e:
+        print(f"❌ 特征提取出错: {e}")
+        raise HTTPException(status_code=500, detail=f"特征提取出错: {str(e)}")
+
+    return serialize({
+        "success": True,
+        "dim": embedding.numel(),
+        "embedding": embedding.tolist(),
+        "model_version": plant_model.model_version,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+def expand_archive(filename, content, max_files=BATCH_MAX_FILES, max_bytes=BATCH_MAX_BYTES):
+    """展开 zip / tar 压缩包，返回其中图片文件的 (文件名, 字节) 列表
+
+    读取每个成员之前先按其声明的解压大小检查单张与累计字节数，图片数超过 max_files 时立即停止，
+    防止条目极多的小压缩包或压缩炸弹耗尽内存。
+    """
+    images = []
+    total_bytes = 0
+
+    def admit(name, size):
+        nonlocal total_bytes
+        if len(images) >= max_files:
+            raise UploadRejected(413, f"单次最多识别 {BATCH_MAX_FILES} 张图片")
+        if size > UPLOAD_MAX_BYTES:
+            raise UploadRejected(413, f"压缩包中的图片过大: {name}")
+        total_bytes += size
+        if total_bytes > max_bytes:
+            raise UploadRejected(413, f"压缩包解压后超过 {max_bytes // (1024 * 1024)}MB: {filename}")
+
+    if zipfile.is_zipfile(io.BytesIO(content)):
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS:
+                    # ZipExtFile 最多返回 file_size 字节，声明值即读取上限
+                    admit(info.filename, info.file_size)
+                    images.append((info.filename, archive.read(info)))
+    else:
+        with tarfile.open(fileobj=io.BytesIO(content), mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and os.path.splitext(member.name)[1].lower() in IMAGE_EXTENSIONS:
+                    admit(member.name, member.size)
+                    images.append((member.name, archive.extractfile(member).read()))
+    return images
+
+
+async def read_batch_part(file, limit, upload=None):
+    """分块读取批量请求中的一个文件，累计超过 limit 字节时拒绝；upload 非空时同时校验图片格式与像素数"""
+    size = 0
+    content = bytearray()
+    while True:
+        chunk = await file.read(1024 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise UploadRejected(413, f"批量图片总大小超过 {BATCH_MAX_BYTES // (1024 * 1024)}MB")
+        if upload is not None:
+            upload.feed(chunk)
+        else:
+            content += chunk
+    return bytes(upload.finish() if upload is not None else content)
+
+
+def is_archive(file):
+    name = (file.filename or "").lower()
+    return (file.content_type in ("application/zip", "application/x-zip-compressed",
+                                  "application/x-tar", "application/gzip", "application/x-gzip")
+            or name.endswith((".zip", ".tar", ".tar.gz", ".tgz")))
+
+
+@app.post("/api/identify/batch")
+async def identify_plants_batch(files: List[UploadFile] = File(...)):
+    """批量植物识别端点：支持多张图片或 zip / tar 压缩包"""
+    if plant_model is None:
+        raise HTTPException(status_code=503, detail="模型未加载，请检查服务状态")
+
+    loop = asyncio.get_running_loop()
+    images = []
+    total_bytes = 0
+    for file in files:
+        remaining = BATCH_MAX_BYTES - total_bytes
+        if is_archive(file):
+            try:
+                content = await read_batch_part(file, remaining)
+                members = await loop.run_in_executor(
+                    None, expand_archive, file.filename, content, BATCH_MAX_FILES - len(images), remaining)
+            except UploadRejected as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+            except (zipfile.BadZipFile, tarfile.TarError) as e:
+                raise HTTPException(status_code=400, detail=f"压缩包解析失败: {file.filename} ({e})")
+            images.extend(members)
+            total_bytes += sum(len(data) for _, data in members)
+        elif file.content_type and file.content_type.startswith('image/'):
+            # 与单图识别相同的校验：单张大小、文件头魔数与像素数
+            try:
+                content = await read_batch_part(
+                    file, remaining, ImageUpload(file.filename, UPLOAD_MAX_BYTES, UPLOAD_MAX_PIXELS))
+            except UploadRejected as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{e.detail}: {file.filename}")
+            images.append((file.filename, content))
+            total_bytes += len(content)
+        else:
+            raise HTTPException(status_code=400, detail=f"请上传图片文件或压缩包: {file.filename}")
+
+        if len(images) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=413, detail=f"单次最多识别 {BATCH_MAX_FILES} 张图片")
+
+    if not images:
+        raise HTTPException(status_code=400, detail="未找到可识别的图片")
+
+    print(f"📸 批量处理图片: {len(images)} 张")
+
+    try:
+        results = await plant_model.predict_batch([content for _, content in images], batch_size=BATCH_MAX_SIZE)
+    except InferenceQueueFull as e:
+        print(f"⏳ 推理队列已满: {e}")
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+    except Exception as e:
+        print(f"❌ 批量识别过程出错: {e}")
+        raise HTTPException(status_code=500, detail=f"批量识别过程出错: {str(e)}")
+
+    items = []
+    for (filename, _), result in zip(images, results):
+        if result["success"] and result["predictions"]:
+            items.append({
+                "filename": filename,
+                "success": True,
+                "identification": {
+                    "top_prediction": result["top_prediction"],
+                    "all_predictions": result["predictions"]
+                }
+            })
+        else:
+            items.append({
+                "filename": filename,
+                "success": False,
+                "error": result.get("error", "未知错误")
+            })
+
+    succeeded = sum(1 for item in items if item["success"])
+    print(f"✅ 批量识别完成: {succeeded}/{len(items)}")
+
+    return {
+        "success": succeeded > 0,
+        "total": len(items),
+        "succeeded": succeeded,
+        "results": items,
+        "message": f"批量识别完成: {succeeded}/{len(items)}",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @app.get("/api/plants/{plant_name}")
 async def get_plant_details(plant_name: str):
     """获取植物详细信息"""
@@ -0,0 +1,176 @@
+import asyncio
+import time
+
+from backend.models.inference_executor import InferenceQueueFull
+from backend.models.pipeline import StageTimer
+
+
+class BatchScheduler:
+    """动态微批调度器：将并发请求合并为一个批次，统一执行一次前向推理"""
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=5.0, max_queue_size=0,
+                 max_concurrent_batches=1, discard=None):
+        # process_batch: 异步函数，接收样本列表，返回等长的结果列表
+        self.process_batch = process_batch
+        # discard: 样本不会被处理时（请求已取消）调用，用于归还样本占用的资源
+        self.discard = discard
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        # 有界队列：推理跟不上、队列已满时 submit 直接抛出 InferenceQueueFull（0 表示不限）
+        self.max_queue_size = max(0, int(max_queue_size))
+        # 同时执行的批次数上限（通常等于推理执行器的 max_in_flight）；
+        # 名额用满时不再收集新批次，排队的请求会合并成更大的批次
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        self._queue = None
+        self._worker = None
+        self._slots = None
+        self._tasks = set()
+
+        # 统计信息
+        self.total_batches = 0
+        self.total_items = 0
+        self.rejected = 0
+        self.queue_wait = StageTimer()
+        self.batch_time = StageTimer()
+
+    @property
+    def average_batch_size(self):
+        if self.total_batches == 0:
+            return 0.0
+        return self.total_items / self.total_batches
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self):
+        """在当前事件循环中懒启动后台批处理任务"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        """提交单个样本，等待其所在批次完成后返回对应结果"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            # 样本未入队，归还其占用的资源后拒绝请求
+            self.rejected += 1
+            self._discard(item)
+            raise InferenceQueueFull(f"批处理队列已满 ({self.queue_depth}/{self.max_queue_size})") from None
+        return await future
+
+    def _discard(self, item):
+        if self.discard is not None:
+            self.discard(item)
+
+    def _fail(self, entries, error):
+        """结束不会被执行的请求：通知等待方并归还样本占用的资源"""
+        for item, future, _ in entries:
+            if not future.done():
+                future.set_exception(error)
+            self._discard(item)
+
+    async def _collect_batch(self):
+        """按最大批大小或最大等待时间收集一批请求"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        try:
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # 收集途中被关闭，已取出的请求不会再执行
+            self._fail(batch, RuntimeError("批处理调度器已关闭"))
+            raise
+
+        # 记录排队耗时，并跳过已被取消的请求（如客户端断开）
+        now = time.perf_counter()
+        for item, future, enqueued in batch:
+            self.queue_wait.record((now - enqueued) * 1000)
+            if future.done():
+                self._discard(item)
+        return [(item, future) for item, future, _ in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # 先占用一个执行名额再收集批次，批次作为独立任务执行，不阻塞下一批的收集
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            if not batch:
+                self._slots.release()
+                continue
+            task = loop.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch):
+        items = [item for item, _ in batch]
+        begin = time.perf_counter()
+        try:
+            results = await self.process_batch(items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.batch_time.record((time.perf_counter() - begin) * 1000)
+            self._slots.release()
+
+        self.total_batches += 1
+        self.total_items += len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_queue_size": self.max_queue_size,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "in_flight_batches": len(self._tasks),
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "total_batches": self.total_batches,
+            "average_batch_size": self.average_batch_size,
+            "queue_wait": self.queue_wait.stats(),
+            "batch": self.batch_time.stats()
+        }
+
+    async def close(self):
+        """停止后台批处理任务，等待已开始执行的批次完成；仍在排队的请求以 RuntimeError 结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            pending = []
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            self._fail(pending, RuntimeError("批处理调度器已关闭"))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
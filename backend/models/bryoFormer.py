@@ -1,5 +1,6 @@
 import math
 import logging
+import time
 from functools import partial
 from collections import OrderedDict
 from copy import Error, deepcopy
@@ -14,9 +15,22 @@ from timm.layers import DropPath, to_2tuple, trunc_normal_
 import torch.fft
 from timm.models import register_model
 from torch.nn.modules.container import Sequential
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 _logger = logging.getLogger(__name__)
 
+# F.scaled_dot_product_attention 在 torch 2.0 引入，scale 参数需要 torch >= 2.1
+SDPA_AVAILABLE = tuple(int(part) for part in torch.__version__.split('.')[:2]) >= (2, 1)
+
+
+def fold_conv_bn_sequential(seq):
+    """将 Sequential 中紧邻的 Conv2d -> BatchNorm2d 折叠为带偏置的单个 Conv2d"""
+    layers = list(seq)
+    for i in range(len(layers) - 1):
+        if isinstance(layers[i], nn.Conv2d) and isinstance(layers[i + 1], nn.BatchNorm2d):
+            seq[i] = fuse_conv_bn_eval(layers[i], layers[i + 1])
+            seq[i + 1] = nn.Identity()
+
 
 def _cfg(url='', **kwargs):
     return {
@@ -28,12 +42,67 @@ def _cfg(url='', **kwargs):
         **kwargs
     }
 
+def _is_compiling():
+    """torch.compile 追踪期间返回 True（旧版本 torch 没有 torch.compiler.is_compiling）"""
+    if hasattr(torch, "compiler") and hasattr(torch.compiler, "is_compiling"):
+        return torch.compiler.is_compiling()
+    return torch._dynamo.is_compiling()
+
+
 class SpectralGatingNetwork(nn.Module):
     def __init__(self, dim, h=14, w=8):
         super().__init__()
         self.complex_weight = nn.Parameter(torch.randn(h, w, dim, 2, dtype=torch.float32) * 0.02)
         self.w = w
         self.h = h
+        # 推理时缓存复数滤波器；权重被原地修改或重新加载后（版本号 / 存储地址变化）自动失效
+        self.cache_weight = True
+        self._weight_cache = None
+        self._weight_cache_key = None
+        # 执行策略：fft（rfft2/irfft2）或 conv（等价的空间循环卷积，仅推理）
+        self.strategy = "fft"
+        self._spatial_kernel = None
+        self._kernel_cache_key = None
+
+    def get_complex_weight(self):
+        # torch.compile 追踪时不走缓存：缓存键是 Python 属性，dynamo 会对其加守卫，导致每个实例各自重新编译
+        if (self.training or not self.cache_weight or torch.is_grad_enabled() or torch.jit.is_tracing()
+                or _is_compiling()):
+            return torch.view_as_complex(self.complex_weight.contiguous())
+        key = (self.complex_weight.data_ptr(), self.complex_weight._version)
+        if key != self._weight_cache_key:
+            # model.to(memory_format=channels_last) 也会改变该 4D 参数的步长，需先恢复连续布局
+            self._weight_cache = torch.view_as_complex(self.complex_weight.detach().contiguous())
+            self._weight_cache_key = key
+        return self._weight_cache
+
+    def get_spatial_kernel(self, a, b):
+        """将频域滤波器转换为等价的空间循环卷积核 [C, 1, a, b]（已翻转，可直接用于 conv2d）"""
+        if _is_compiling():
+            return self._compute_spatial_kernel(a, b)
+        key = (self.complex_weight.data_ptr(), self.complex_weight._version, a, b)
+        if key != self._kernel_cache_key:
+            self._spatial_kernel = self._compute_spatial_kernel(a, b)
+            self._kernel_cache_key = key
+        return self._spatial_kernel
+
+    @torch.no_grad()
+    def _compute_spatial_kernel(self, a, b):
+        # 滤波是线性且循环平移不变的，其冲激响应即为卷积核
+        C = self.complex_weight.shape[2]
+        impulse = torch.zeros(1, a, b, C, device=self.complex_weight.device)
+        impulse[:, 0, 0, :] = 1.0
+        response = torch.fft.rfft2(impulse, dim=(1, 2), norm='ortho')
+        response = response * torch.view_as_complex(self.complex_weight.detach().contiguous())
+        response = torch.fft.irfft2(response, s=(a, b), dim=(1, 2), norm='ortho')
+        return response[0].flip(0, 1).permute(2, 0, 1).unsqueeze(1).contiguous()
+
+    def _forward_conv(self, x, a, b):
+        B, N, C = x.shape
+        x = x.view(B, a, b, C).permute(0, 3, 1, 2)
+        x = F.pad(x, (b - 1, 0, a - 1, 0), mode='circular')
+        x = F.conv2d(x, self.get_spatial_kernel(a, b), groups=C)
+        return x.permute(0, 2, 3, 1).reshape(B, N, C)
 
     def forward(self, x, spatial_size=None):
         B, N, C = x.shape
@@ -41,10 +110,13 @@ class SpectralGatingNetwork(nn.Module):
             a = b = int(math.sqrt(N))
         else:
             a, b = spatial_size
+        if x.dtype != torch.float32:
+            x = x.to(torch.float32)
+        if self.strategy == "conv" and not self.training:
+            return self._forward_conv(x, a, b)
         x = x.view(B, a, b, C)
-        x = x.to(torch.float32)
         x = torch.fft.rfft2(x, dim=(1, 2), norm='ortho')
-        weight = torch.view_as_complex(self.complex_weight)
+        weight = self.get_complex_weight()
         x = x * weight
         x = torch.fft.irfft2(x, s=(a, b), dim=(1, 2), norm='ortho')
         x = x.reshape(B, N, C)
@@ -81,6 +153,12 @@ class SpatialAttention(nn.Module):
         self.conv_att = nn.Conv2d(2, 1, kernel_size=3, padding=1, bias=False)
         self.sigmoid = nn.Sigmoid()
 
+    def fuse_for_inference(self):
+        """将 bn 折叠进 dw_conv"""
+        if isinstance(self.bn, nn.BatchNorm2d):
+            self.dw_conv = fuse_conv_bn_eval(self.dw_conv, self.bn)
+            self.bn = nn.Identity()
+
     def forward(self, x):
         x = self.bn(self.dw_conv(x))
         avg_out = torch.mean(x, dim=1, keepdim=True)  # [B,1,H,W]
@@ -99,6 +177,10 @@ class FeatureFusion(nn.Module):
             nn.ReLU(inplace=True)
         )
 
+    def fuse_for_inference(self):
+        """将 conv_fusion 中的 BN 折叠进 1x1 卷积"""
+        fold_conv_bn_sequential(self.conv_fusion)
+
     def forward(self, x, channel_feat, spatial_feat):
         fused = torch.cat([channel_feat, spatial_feat], dim=1)
         return self.conv_fusion(fused)
@@ -129,12 +211,12 @@ class FreqTimeBridge(nn.Module):
         self.proj = nn.Linear(dim, dim)
         self.alpha = nn.Parameter(torch.tensor(0.5))  # 控制残差强度
 
-    def forward(self, x):
+    def forward(self, x, spatial_size=None):
         B, N, C = x.shape
-        H = W = int(math.sqrt(N))
+        H, W = spatial_size or (int(math.sqrt(N)),) * 2
         # 第一步：频域增强
         x_norm = self.norm(x)  # 层归一化
-        x_freq = self.spectral(x_norm)  # 频域滤波 [B,N,C]
+        x_freq = self.spectral(x_norm, (H, W))  # 频域滤波 [B,N,C]
         # 第二步：转换为2D并处理注意力
         x_2d = x_freq.transpose(1, 2).view(B, C, H, W)  # [B,C,H,W]
         x_attn = self.attn_module(x_2d)  # 并行通道+空间注意力
@@ -153,8 +235,8 @@ class Block(nn.Module):
         mlp_hidden_dim = int(dim * mlp_ratio)
         self.mlp = Mlp(in_features=dim, hidden_features=mlp_hidden_dim, act_layer=act_layer, drop=drop)
 
-    def forward(self, x):
-        x = x + self.drop_path(self.mlp(self.norm2(self.filter(self.norm1(x)))))
+    def forward(self, x, spatial_size=None):
+        x = x + self.drop_path(self.mlp(self.norm2(self.filter(self.norm1(x), spatial_size))))
         return x
 
 
@@ -168,11 +250,12 @@ class Block_attention(nn.Module):
         self.mlp = Mlp(in_features=dim, hidden_features=mlp_hidden_dim, act_layer=act_layer, drop=drop)
         self.attn = OSRAttention(dim=dim, num_heads=6, qk_scale=None, attn_drop=drop, sr_ratio=2)
 
-    def forward(self, x):
+    def forward(self, x, spatial_size=None):
         B, N, C = x.shape
-        H = W = int(math.sqrt(N))
+        H, W = spatial_size or (int(math.sqrt(N)),) * 2
         x_2d = x.transpose(1, 2).view(B, C, H, W)
-        attn_out = self.attn(x_2d).view(B, C, N).transpose(1, 2)
+        # x_2d 是 token 张量的零拷贝视图（步长即 channels_last），注意力直接输出 token 布局
+        attn_out = self.attn(x_2d, return_tokens=True)
         x = x + self.drop_path(attn_out)
         x = x + self.drop_path(self.mlp(self.norm2(x)))
         return x
@@ -205,25 +288,53 @@ class OSRAttention(nn.Module):
             self.sr = nn.Identity()
 
         self.local_conv = nn.Conv2d(dim, dim, kernel_size=3, padding=1, groups=dim)
-
-    def forward(self, x, relative_pos_enc=None):
+        # 推理融合后残差连接已并入 local_conv 的卷积核中心
+        self.local_residual_fused = False
+        # 推理时使用融合的 scaled_dot_product_attention，不显式构造注意力矩阵
+        self.fused_attn = SDPA_AVAILABLE
+
+    def fuse_for_inference(self):
+        """折叠 sr 中的 BN，并把 local_conv 的恒等残差并入卷积核"""
+        if isinstance(self.sr, nn.Sequential):
+            fold_conv_bn_sequential(self.sr)
+        if not self.local_residual_fused:
+            # 写入新的权重张量而不是原地修改：原权重可能与未融合模型共享或来自只读内存映射
+            with torch.no_grad():
+                center = self.local_conv.kernel_size[0] // 2
+                weight = self.local_conv.weight.detach().clone()
+                weight[:, 0, center, center] += 1.0
+            self.local_conv.weight = nn.Parameter(weight, requires_grad=self.local_conv.weight.requires_grad)
+            self.local_residual_fused = True
+
+    def forward(self, x, relative_pos_enc=None, return_tokens=False):
         B, C, H, W = x.shape
         q = self.q(x).reshape(B, self.num_heads, C // self.num_heads, -1).transpose(-1, -2)
         kv = self.sr(x)
-        kv = self.local_conv(kv) + kv
+        kv = self.local_conv(kv) if self.local_residual_fused else self.local_conv(kv) + kv
         k, v = torch.chunk(self.kv(kv), chunks=2, dim=1)
         k = k.reshape(B, self.num_heads, C // self.num_heads, -1)
         v = v.reshape(B, self.num_heads, C // self.num_heads, -1).transpose(-1, -2)
-        attn = (q @ k) * self.scale
-        if relative_pos_enc is not None:
-            if attn.shape[2:] != relative_pos_enc.shape[2:]:
-                relative_pos_enc = F.interpolate(relative_pos_enc, size=attn.shape[2:], mode='bicubic',
-                                                 align_corners=False)
-            attn = attn + relative_pos_enc
-        attn = torch.softmax(attn, dim=-1)
-        attn = self.attn_drop(attn)
-        x = (attn @ v).transpose(-1, -2)
-        return x.reshape(B, C, H, W)
+        attn_shape = (q.shape[2], k.shape[3])
+        if relative_pos_enc is not None and relative_pos_enc.shape[2:] != attn_shape:
+            relative_pos_enc = F.interpolate(relative_pos_enc, size=attn_shape, mode='bicubic',
+                                             align_corners=False)
+
+        if self.fused_attn and not self.training:
+            # relative_pos_enc 作为加性 attn_mask 传入
+            x = F.scaled_dot_product_attention(q, k.transpose(-1, -2), v, attn_mask=relative_pos_enc,
+                                               scale=self.scale)
+        else:
+            attn = (q @ k) * self.scale
+            if relative_pos_enc is not None:
+                attn = attn + relative_pos_enc
+            attn = torch.softmax(attn, dim=-1)
+            attn = self.attn_drop(attn)
+            x = attn @ v
+
+        # x: [B, heads, N, head_dim]
+        if return_tokens:
+            return x.transpose(1, 2).reshape(B, H * W, C)
+        return x.transpose(-1, -2).reshape(B, C, H, W)
 
 
 class Mlp(nn.Module):
@@ -253,6 +364,7 @@ class PatchEmbed(nn.Module):
         num_patches = (img_size[1] // patch_size[1]) * (img_size[0] // patch_size[0])
         self.img_size = img_size
         self.patch_size = patch_size
+        self.grid_size = (img_size[0] // patch_size[0], img_size[1] // patch_size[1])
         self.num_patches = num_patches
 
         self.stage1 = nn.Sequential(
@@ -275,6 +387,25 @@ class PatchEmbed(nn.Module):
         return x
 
 
+class ExitHead(nn.Module):
+    """早退辅助分类头：先对 token 做全局平均池化，再 LayerNorm + Linear，计算量远小于一个 block"""
+
+    def __init__(self, dim, num_classes, norm_layer=nn.LayerNorm):
+        super().__init__()
+        self.norm = norm_layer(dim)
+        self.head = nn.Linear(dim, num_classes)
+
+    def classify(self, pooled):
+        return self.head(self.norm(pooled))
+
+    def forward(self, x):
+        return self.classify(x.mean(1))
+
+
+# 默认在第 2、4 个频域 Block 之后放置早退辅助头，均位于 FreqTimeBridge / Block_attention 之前
+DEFAULT_EXIT_BLOCKS = (1, 3)
+
+
 class BryoFormer(nn.Module):
     def __init__(self, img_size=224, patch_size=16, in_chans=3, num_classes=44, embed_dim=384, depth=8,
                  mlp_ratio=2., representation_size=None, uniform_drop=False,
@@ -290,8 +421,9 @@ class BryoFormer(nn.Module):
         self.pos_embed = nn.Parameter(torch.zeros(1, num_patches, embed_dim))
         self.pos_drop = nn.Dropout(p=drop_rate)
 
-        h = img_size // patch_size
-        w = h // 2 + 1
+        # 频域滤波器尺寸：rfft2 只保留最后一维的一半频率
+        h, grid_w = self.patch_embed.grid_size
+        w = grid_w // 2 + 1
 
         if uniform_drop:
             dpr = [drop_path_rate for _ in range(depth)]
@@ -310,6 +442,12 @@ class BryoFormer(nn.Module):
                                                norm_layer=norm_layer, h=h, w=w))
 
         self.norm = norm_layer(embed_dim)
+        self.norm_layer = norm_layer
+
+        # 早退辅助头（键为所在 block 的编号），默认为空以兼容已有权重，见 add_exit_heads
+        self.exit_heads = nn.ModuleDict()
+        self.exit_threshold = None
+
         if representation_size:
             self.pre_logits = nn.Sequential(OrderedDict([
                 ('fc', nn.Linear(embed_dim, representation_size)),
@@ -336,19 +474,137 @@ class BryoFormer(nn.Module):
             nn.init.constant_(m.bias, 0)
             nn.init.constant_(m.weight, 1.0)
 
+    @torch.no_grad()
+    def fuse_for_inference(self, verify=True, atol=1e-4):
+        """返回折叠 BN 后的等价推理模型副本（仅用于 eval），verify 时与原模型做数值校验
+
+        副本只新建模块对象，参数与缓冲区与原模型共享，只有被改写的卷积 / BN 生成新张量，
+        内存映射加载的权重（见 load_fast_weights）因此仍指向页缓存，不会在每个 worker 中复制一份。
+        """
+        shared = {id(tensor): tensor for tensor in (*self.parameters(), *self.buffers())}
+        fused = deepcopy(self, shared).eval()
+        for module in list(fused.modules()):
+            if module is not fused and hasattr(module, 'fuse_for_inference'):
+                module.fuse_for_inference()
+
+        if verify:
+            was_training = self.training
+            self.eval()
+            device = self.pos_embed.device
+            size = self.patch_embed.img_size
+            x = torch.randn(2, self.patch_embed.stage1[0].in_channels, size[0], size[1], device=device)
+            max_diff = (self(x) - fused(x)).abs().max().item()
+            self.train(was_training)
+            if max_diff > atol:
+                raise RuntimeError(f"fused model mismatch: max abs diff {max_diff:.2e} > {atol:.0e}")
+            _logger.info('Fused model verified, max abs diff %.2e', max_diff)
+        return fused
+
+    def set_spectral_strategy(self, strategy):
+        """设置所有 SpectralGatingNetwork 的执行策略：fft 或 conv"""
+        if strategy not in ("fft", "conv"):
+            raise ValueError(f"unknown spectral strategy: {strategy}")
+        for module in self.modules():
+            if isinstance(module, SpectralGatingNetwork):
+                module.strategy = strategy
+
+    @torch.no_grad()
+    def autotune_spectral_strategy(self, batch_size=1, repeats=10):
+        """在当前硬件上比较 fft 与 conv 两种频域滤波实现，应用更快的一种并返回 (策略, 各策略耗时 ms)"""
+        spectral = next(m for m in self.modules() if isinstance(m, SpectralGatingNetwork))
+        grid = self.patch_embed.grid_size
+        x = torch.randn(batch_size, grid[0] * grid[1], self.embed_dim, device=self.pos_embed.device)
+
+        timings = {}
+        for strategy in ("fft", "conv"):
+            spectral.strategy = strategy
+            spectral(x, grid)  # 预热并生成卷积核缓存
+            begin = time.perf_counter()
+            for _ in range(repeats):
+                spectral(x, grid)
+            timings[strategy] = (time.perf_counter() - begin) * 1000 / repeats
+
+        best = min(timings, key=timings.get)
+        self.set_spectral_strategy(best)
+        _logger.info('Spectral strategy autotuned to %s (%s)', best, timings)
+        return best, timings
+
+    def add_exit_heads(self, blocks=DEFAULT_EXIT_BLOCKS):
+        """在指定编号的 block 之后添加早退辅助头（随机初始化，需另行训练，见 backend/tools/early_exit.py）"""
+        for index in blocks:
+            if not 0 <= index < len(self.blocks) - 1:
+                raise ValueError(f"invalid exit block index: {index}")
+            head = ExitHead(self.embed_dim, self.num_classes, norm_layer=self.norm_layer)
+            head.apply(self._init_weights)
+            self.exit_heads[str(index)] = head.to(self.pos_embed.device)
+
+    def load_exit_heads(self, state_dict):
+        """加载单独保存的辅助头权重（exit_heads.state_dict()），按键名前缀创建对应的头"""
+        blocks = sorted({int(key.split('.')[0]) for key in state_dict})
+        self.add_exit_heads(blocks)
+        self.exit_heads.load_state_dict(state_dict)
+
+    def forward_early_exit(self, x, threshold=None):
+        """早退推理：辅助头最大 softmax 概率达到阈值的样本直接返回，其余样本继续计算后续 block
+
+        返回 (logits, 退出位置)，退出位置为辅助头所在 block 的编号，走完全部 block 的样本为 len(self.blocks)
+        """
+        threshold = self.exit_threshold if threshold is None else threshold
+        B = x.shape[0]
+        x = self.patch_embed(x)
+        x = x + self.pos_embed
+        x = self.pos_drop(x)
+
+        spatial_size = self.patch_embed.grid_size
+        remaining = torch.arange(B, device=x.device)
+        indices, outputs, exits = [], [], []
+        for index, blk in enumerate(self.blocks):
+            x = blk(x, spatial_size)
+            key = str(index)
+            if key not in self.exit_heads:
+                continue
+            logits = self.exit_heads[key](x)
+            confident = logits.softmax(dim=-1).amax(dim=-1) >= threshold
+            if confident.any():
+                indices.append(remaining[confident])
+                outputs.append(logits[confident])
+                exits.append(torch.full_like(indices[-1], index))
+                # 只保留未退出的样本继续计算
+                remaining = remaining[~confident]
+                x = x[~confident]
+                if remaining.numel() == 0:
+                    break
+
+        if remaining.numel():
+            indices.append(remaining)
+            outputs.append(self.head(self.final_dropout(self.norm(x).mean(1))))
+            exits.append(torch.full_like(remaining, len(self.blocks)))
+
+        # 按原始样本顺序还原
+        order = torch.cat(indices)
+        logits, exit_points = torch.cat(outputs), torch.cat(exits)
+        restored = torch.empty_like(logits)
+        restored[order] = logits
+        restored_exits = torch.empty_like(exit_points)
+        restored_exits[order] = exit_points
+        return restored, restored_exits
+
     def forward_features(self, x):
         B = x.shape[0]
         x = self.patch_embed(x)
         x = x + self.pos_embed
         x = self.pos_drop(x)
 
+        spatial_size = self.patch_embed.grid_size
         for blk in self.blocks:
-            x = blk(x)
+            x = blk(x, spatial_size)
 
         x = self.norm(x).mean(1)
         return x
 
     def forward(self, x):
+        if self.exit_threshold and len(self.exit_heads) and not self.training:
+            return self.forward_early_exit(x)[0]
         x = self.forward_features(x)
         x = self.final_dropout(x)
         x = self.head(x)
@@ -0,0 +1,41 @@
+import sys
+
+import torch
+import torch.nn as nn
+
+import backend.models as models_package
+from backend.models import bryoFormer
+
+
+def load_checkpoint(path):
+    """加载原始检查点；训练时整模型 pickle 引用的是 models.BryoFormer，这里映射到当前模块"""
+    sys.modules.setdefault("models", models_package)
+    sys.modules.setdefault("models.BryoFormer", bryoFormer)
+    sys.modules.setdefault("models.bryoFormer", bryoFormer)
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+
+def extract_state_dict(checkpoint):
+    """从各种检查点结构中取出模型权重，并去掉 module. / model. 前缀"""
+    if isinstance(checkpoint, nn.Module):
+        state_dict = checkpoint.state_dict()
+    elif 'model_state_dict' in checkpoint:
+        state_dict = checkpoint['model_state_dict']
+    elif 'state_dict' in checkpoint:
+        state_dict = checkpoint['state_dict']
+    elif 'model' in checkpoint:
+        state_dict = checkpoint['model']
+        if isinstance(state_dict, nn.Module):
+            state_dict = state_dict.state_dict()
+    else:
+        state_dict = checkpoint
+
+    stripped = {}
+    for k, v in state_dict.items():
+        if k.startswith('module.'):
+            k = k[7:]
+        elif k.startswith('model.'):
+            k = k[6:]
+        # 只保证连续，不额外复制；已连续的张量直接沿用检查点中的存储
+        stripped[k] = v.detach().contiguous()
+    return stripped
@@ -0,0 +1,72 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class InferenceQueueFull(Exception):
+    """推理排队数超过上限"""
+
+
+class InferenceExecutor:
+    """推理执行器：在独立线程池中运行图像解码与模型前向，避免阻塞事件循环"""
+
+    def __init__(self, max_workers=1, intra_op_threads=None, max_in_flight=None, max_queue_depth=None):
+        # torch 的 intra-op 线程池是进程级的，这里统一固定线程数
+        if intra_op_threads:
+            torch.set_num_threads(int(intra_op_threads))
+
+        self.max_workers = max(1, int(max_workers))
+        self.max_in_flight = int(max_in_flight) if max_in_flight else self.max_workers
+        self.max_queue_depth = int(max_queue_depth) if max_queue_depth else None
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._semaphore = None
+
+        # 统计信息
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    async def run(self, func, *args):
+        """在线程池中执行同步函数，受排队深度与并发上限约束"""
+        if self.max_queue_depth is not None and self.queued >= self.max_queue_depth:
+            self.rejected += 1
+            raise InferenceQueueFull(f"推理队列已满 ({self.queued}/{self.max_queue_depth})")
+
+        self.queued += 1
+        waiting = True
+        try:
+            async with self._get_semaphore():
+                self.queued -= 1
+                waiting = False
+                self.in_flight += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._pool, func, *args)
+                finally:
+                    self.in_flight -= 1
+                    self.completed += 1
+        finally:
+            if waiting:
+                self.queued -= 1
+
+    def stats(self):
+        return {
+            "workers": self.max_workers,
+            "torch_threads": torch.get_num_threads(),
+            "max_in_flight": self.max_in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
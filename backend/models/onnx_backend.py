@@ -0,0 +1,33 @@
+import numpy as np
+
+try:
+    import onnxruntime as ort
+
+    ONNX_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNX_AVAILABLE = False
+
+
+class OnnxRunner:
+    """ONNX Runtime 推理后端：输入输出均为 NumPy 数组，本身不依赖 torch"""
+
+    def __init__(self, onnx_path, intra_op_threads=None):
+        if not ONNX_AVAILABLE:
+            raise ImportError("未安装 onnxruntime，无法使用 ONNX 推理后端")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = int(intra_op_threads)
+
+        self.onnx_path = onnx_path
+        self.session = ort.InferenceSession(onnx_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        print(f"✅ ONNX 模型加载成功: {onnx_path}")
+
+    def __call__(self, batch):
+        """batch: [B, 3, 224, 224] float32，返回 [B, num_classes] logits"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
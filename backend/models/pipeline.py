@@ -0,0 +1,100 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.models.inference_executor import InferenceQueueFull
+
+
+class StageTimer:
+    """阶段耗时统计：累计次数、平均与最大耗时（毫秒）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "max_ms": self.max_ms
+        }
+
+
+class PreprocessStage:
+    """预处理阶段：独立线程池并行解码、缩放与归一化，产出可直接送入推理阶段的张量"""
+
+    def __init__(self, workers=2, max_waiting=None):
+        self.workers = max(1, int(workers))
+        # 排队等待的请求数上限，超出时直接拒绝（None 表示不限）
+        self.max_waiting = int(max_waiting) if max_waiting else None
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preprocess")
+        self._semaphore = None
+
+        # 统计信息
+        self.queued = 0
+        self.active = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = StageTimer()
+        self.work_time = StageTimer()
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._semaphore
+
+    def _timed(self, func, *args):
+        """在工作线程中执行并记录纯处理耗时（不含排队）"""
+        begin = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.work_time.record((time.perf_counter() - begin) * 1000)
+
+    async def run(self, func, *args):
+        """排队等待空闲 worker 后执行预处理函数，排队数超过上限时抛出 InferenceQueueFull"""
+        if self.max_waiting is not None and self.queued >= self.max_waiting:
+            self.rejected += 1
+            raise InferenceQueueFull(f"预处理队列已满 ({self.queued}/{self.max_waiting})")
+
+        begin = time.perf_counter()
+        self.queued += 1
+        waiting = True
+        try:
+            async with self._get_semaphore():
+                self.queued -= 1
+                waiting = False
+                self.wait_time.record((time.perf_counter() - begin) * 1000)
+                self.active += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._pool, self._timed, func, *args)
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    self.active -= 1
+        finally:
+            if waiting:
+                self.queued -= 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_waiting": self.max_waiting,
+            "queued": self.queued,
+            "active": self.active,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait": self.wait_time.stats(),
+            "work": self.work_time.stats()
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -2,20 +2,149 @@ import torch
 import torch.nn as nn
 from torchvision import transforms
 from PIL import Image
+import asyncio
+import contextlib
+import hashlib
+import io
 import json
 import os
+import threading
+import time
 from backend.models.bryoFormer import BryoFormer
+from backend.models.checkpoint import extract_state_dict, load_checkpoint
+from backend.models.batch_scheduler import BatchScheduler
+from backend.models.pipeline import PreprocessStage
+from backend.models.inference_executor import InferenceExecutor, InferenceQueueFull
+from backend.models.onnx_backend import OnnxRunner
+from backend.models.preprocess import FastPreprocessor
+from backend.models.tensor_pool import TensorPool
+from backend.models.metrics import BATCH_SIZE_BUCKETS
+from backend.models.profiler import ModuleProfiler
+
+# 快速权重格式：仅含张量、键名已去前缀，可直接内存映射（由 backend/tools/convert_weights.py 生成）
+FAST_WEIGHTS_SUFFIX = ".weights.pt"
+
+# 单张图像的模型输入形状
+INPUT_SHAPE = (3, 224, 224)
 
 
 class PlantRecognitionModel:
-    def __init__(self, model_path=None, num_classes=44, device=None):
+    def __init__(self, model_path=None, num_classes=44, device=None,
+                 max_batch_size=1, max_batch_wait_ms=5.0, executor=None, cache=None,
+                 quantize=False, backend="torch", onnx_path=None, compile_mode=None,
+                 fuse=False, spectral_strategy="fft", channels_last=False, bf16=False, model=None,
+                 fast_preprocess=False, preprocess_workers=0, max_batch_queue=0, tensor_pool_size=0,
+                 metrics=None, reference_index=None, exit_heads_path=None, exit_threshold=0.0):
         self.device = device or torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.num_classes = num_classes
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.quantize = quantize
+        self.backend = backend
+        if compile_mode not in (None, "torchscript", "compile"):
+            raise ValueError(f"不支持的编译模式: {compile_mode}")
+        self.compile_mode = compile_mode
+        self.fuse = fuse
+        if spectral_strategy not in ("fft", "conv", "auto"):
+            raise ValueError(f"不支持的频域滤波策略: {spectral_strategy}")
+        self.spectral_strategy = spectral_strategy
+        self.channels_last = channels_last
+        if bf16 and not self.bf16_supported():
+            print("⚠️  当前硬件不支持 bfloat16 加速，继续使用 float32")
+            bf16 = False
+        self.bf16 = bf16
+        # 早退辅助头权重（由 backend/tools/early_exit.py 训练生成），在 load_model 中加载
+        self.exit_heads_path = exit_heads_path
 
         print("🚀 初始化植物识别模型...")
-        self.model = self.load_model(model_path)
+        # 推理后端：torch（PyTorch eager）或 onnx（ONNX Runtime）
+        self.model = None
+        self.onnx_runner = None
+        # 权重是否内存映射自快速权重文件（页缓存本身即可在进程间共享）
+        self.mmap_weights = False
+        if backend == "onnx":
+            model_path = onnx_path
+            self.onnx_runner = OnnxRunner(onnx_path)
+        elif backend == "torch":
+            # 传入 model 时直接使用（如 pre-fork 父进程中已加载并放入共享内存的模型）
+            self.model = model if model is not None else self.load_model(model_path)
+            if self.compile_mode:
+                self.model = self.compile_model(self.model)
+        else:
+            raise ValueError(f"不支持的推理后端: {backend}")
+        self.model_version = self.compute_model_version(model_path)
         self.class_names = self.load_class_names()
         self.transform = self.get_transform()
+        # 快速预处理：JPEG draft 模式缩小解码 + 合并的缩放归一化
+        self.fast_preprocessor = FastPreprocessor() if fast_preprocess else None
+        # 写入池中缓冲区时使用合并的乘加归一化（与 ToTensor + Normalize 等价）
+        self.tensor_writer = self.fast_preprocessor or FastPreprocessor()
+
+        # 参考图片向量索引（VectorIndex），用于返回视觉相似的参考照片
+        self.reference_index = reference_index
+        if reference_index is not None and reference_index.model_version not in ("", self.model_version):
+            print("⚠️  参考图片索引由其他版本的模型权重生成，相似度结果可能不准确")
+
+        # 逐层性能剖析（按需开启，见 start_profiling）
+        self.profiler = None
+
+        # 分阶段耗时指标（MetricsRegistry），由 /metrics 导出
+        self.phase_seconds = None
+        self.batch_sizes = None
+        self.early_exits = None
+        if metrics is not None:
+            self.phase_seconds = metrics.histogram(
+                "plant_phase_seconds", "各处理阶段耗时（秒）", ["phase"])
+            self.batch_sizes = metrics.histogram(
+                "plant_batch_size", "每次前向推理的批大小", buckets=BATCH_SIZE_BUCKETS)
+            self.early_exits = metrics.counter(
+                "plant_early_exit_total", "各退出位置的样本数（final 为走完全部 block）", ["exit"])
+
+        # 结果缓存：相同图片（按内容哈希）直接返回，无需解码
+        self.cache = cache
+        if self.cache is not None:
+            self.cache.set_model_version(self.model_version)
+
+        # 早退：置信度达到阈值的样本在辅助头处直接返回（0 表示关闭）
+        self.exit_threshold = 0.0
+        self.exit_counts = {}
+        self._exit_lock = threading.Lock()
+        # 预热期间的随机输入不计入早退统计与性能剖析
+        self._warming_up = False
+        if exit_threshold:
+            try:
+                self.set_exit_threshold(exit_threshold)
+                print(f"🚪 启用早退推理: 置信度阈值 {exit_threshold}")
+            except ValueError as e:
+                print(f"⚠️  无法启用早退推理: {e}")
+
+        # 解码与前向推理在独立执行器中运行，不阻塞事件循环
+        self.executor = executor or InferenceExecutor()
+
+        # 输入张量池：预处理原地写入预分配的单图缓冲区，前向时拼入预分配的批次缓冲区，用后归还
+        self.sample_pool = None
+        self.batch_pool = None
+        if tensor_pool_size > 0:
+            self.sample_pool = TensorPool(INPUT_SHAPE, tensor_pool_size)
+            self.batch_pool = TensorPool((self.max_batch_size, *INPUT_SHAPE), self.executor.max_workers)
+
+        # 分阶段流水线：preprocess_workers > 0 时解码与归一化在独立线程池中并行，
+        # 不再与前向推理争用推理执行器；排队上限沿用推理执行器的 max_queue_depth，过载时同样拒绝而不是无限等待
+        self.preprocess_stage = None
+        if preprocess_workers > 0:
+            self.preprocess_stage = PreprocessStage(preprocess_workers, max_waiting=self.executor.max_queue_depth)
+
+        # 动态微批：max_batch_size > 1 时合并并发请求
+        self.batch_scheduler = None
+        if max_batch_size > 1:
+            self.batch_scheduler = BatchScheduler(
+                self._predict_batch,
+                max_batch_size=max_batch_size,
+                max_wait_ms=max_batch_wait_ms,
+                max_queue_size=max_batch_queue,
+                max_concurrent_batches=self.executor.max_in_flight,
+                discard=lambda item: self.release_inputs([item[0]])
+            )
+            print(f"📦 启用动态批处理: 最大批大小 {max_batch_size}, 最长等待 {max_batch_wait_ms}ms")
         print("✅ 模型初始化完成")
 
     def load_model(self, model_path):
@@ -31,61 +160,254 @@ class PlantRecognitionModel:
         )
 
         # 检查模型文件是否存在
-        if model_path and os.path.exists(model_path):
-            print(f"📥 尝试加载模型: {model_path}")
+        if model_path and model_path.endswith(FAST_WEIGHTS_SUFFIX) and os.path.exists(model_path):
+            self.load_fast_weights(model, model_path)
+        elif model_path and os.path.exists(model_path):
+            print(f"📥 加载训练检查点: {model_path}")
             try:
-                # 方法1: 尝试直接加载
-                checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
-
-                # 检查checkpoint结构
-                print(f"🔍 Checkpoint keys: {list(checkpoint.keys())}")
-
-                # 尝试不同的键名
-                if 'model_state_dict' in checkpoint:
-                    state_dict = checkpoint['model_state_dict']
-                elif 'state_dict' in checkpoint:
-                    state_dict = checkpoint['state_dict']
-                elif 'model' in checkpoint:
-                    state_dict = checkpoint['model']
-                else:
-                    state_dict = checkpoint  # 直接是state_dict
-
-                # 修复键名不匹配的问题
-                new_state_dict = {}
-                for k, v in state_dict.items():
-                    # 移除可能的模块前缀
-                    if k.startswith('module.'):
-                        new_k = k[7:]  # 移除 'module.'
-                    elif k.startswith('model.'):
-                        new_k = k[6:]  # 移除 'model.'
-                    else:
-                        new_k = k
-                    new_state_dict[new_k] = v
-
-                # 加载修复后的state_dict
-                model.load_state_dict(new_state_dict, strict=False)
-                print("✅ 模型权重加载成功（使用strict=False）")
-
+                # 训练检查点可能是整模型 pickle（引用 models.BryoFormer）或各种结构的 state_dict
+                model.load_state_dict(extract_state_dict(load_checkpoint(model_path)), strict=True)
+                print("✅ 模型权重加载成功")
             except Exception as e:
-                print(f"❌ 模型权重加载失败: {e}")
-                print("🔄 尝试strict=False加载...")
-                try:
-                    model.load_state_dict(new_state_dict, strict=False)
-                    print("✅ 模型权重加载成功（使用strict=False）")
-                except Exception as e2:
-                    print(f"❌ strict=False也失败: {e2}")
-                    print("⚠️  使用随机初始化权重")
+                # 权重文件存在却无法加载时直接失败，不再静默退回随机初始化
+                raise RuntimeError(f"模型权重加载失败: {model_path} ({e})") from e
         else:
             print("⚠️  未找到预训练权重，使用随机初始化模型")
 
+        if self.exit_heads_path and os.path.exists(self.exit_heads_path):
+            self.load_exit_heads(model, self.exit_heads_path)
+
         # 统计模型参数
         total_params = sum(p.numel() for p in model.parameters())
         print(f"📈 模型参数总数: {total_params:,}")
 
         model = model.to(self.device)
         model.eval()
+
+        if self.fuse:
+            model = self.fuse_model(model)
+        self.apply_spectral_strategy(model)
+        if self.channels_last:
+            model = model.to(memory_format=torch.channels_last)
+            print("🧱 已启用 channels_last 内存布局")
+        if self.quantize:
+            model = self.quantize_model(model)
+        return model
+
+    def load_fast_weights(self, model, model_path):
+        """内存映射加载快速权重：张量直接引用页缓存，同一主机上的多个 worker 共享同一份物理内存"""
+        print(f"📥 内存映射加载权重: {model_path}")
+        state_dict = torch.load(model_path, map_location="cpu", mmap=True, weights_only=True)
+        # assign=True 直接使用映射的张量作为参数，不再额外拷贝
+        model.load_state_dict(state_dict, strict=True, assign=True)
+        self.mmap_weights = True
+        print("✅ 模型权重加载成功（mmap）")
+
+    def load_exit_heads(self, model, path):
+        """加载早退辅助头，失败时只使用完整模型"""
+        try:
+            model.load_exit_heads(torch.load(path, map_location="cpu", weights_only=True))
+            print(f"🚪 已加载早退辅助头: block {', '.join(model.exit_heads.keys())}")
+        except Exception as e:
+            print(f"❌ 早退辅助头加载失败，只使用完整模型: {e}")
+
+    def fuse_model(self, model):
+        """折叠 BatchNorm 等推理期可合并的算子，数值校验失败时保留原模型"""
+        try:
+            model = model.fuse_for_inference(verify=True)
+            print("🔗 已折叠 BatchNorm 到前置卷积")
+        except Exception as e:
+            print(f"❌ 算子融合失败，使用未融合模型: {e}")
+        return model
+
+    def bf16_supported(self):
+        """CPU 需要 AVX-512 / AMX 才能从 bfloat16 获益"""
+        if self.device.type == 'cuda':
+            return torch.cuda.is_bf16_supported()
+        capability = torch.backends.cpu.get_cpu_capability()
+        return "AVX512" in capability or "AMX" in capability
+
+    def apply_spectral_strategy(self, model):
+        """设置频域滤波实现：fft、conv（等价空间卷积），或 auto 在本机实测后选择更快者"""
+        if self.spectral_strategy == "auto":
+            strategy, timings = model.autotune_spectral_strategy(batch_size=self.max_batch_size)
+            detail = ", ".join(f"{name} {ms:.2f}ms" for name, ms in timings.items())
+            print(f"🎛️  频域滤波策略自动选择: {strategy} ({detail})")
+        elif self.spectral_strategy == "conv":
+            model.set_spectral_strategy("conv")
+            print("🎛️  频域滤波策略: conv")
+
+    def quantize_model(self, model):
+        """对 nn.Linear 层（Mlp、FreqTimeBridge.proj、head）做动态 int8 量化，仅支持 CPU"""
+        if self.device.type != 'cpu':
+            print("⚠️  int8 动态量化仅支持 CPU，继续使用 float32 模型")
+            return model
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        print("🗜️  已启用 int8 动态量化 (nn.Linear)")
+        return model
+
+    def compile_model(self, model):
+        """编译模型：torchscript（trace + freeze）或 torch.compile，失败时回退到 eager 模式"""
+        try:
+            if self.compile_mode == "torchscript":
+                example = torch.randn(1, 3, 224, 224, device=self.device)
+                with torch.no_grad():
+                    model = torch.jit.freeze(torch.jit.trace(model, example))
+            else:
+                # torch.compile 是惰性的，编译错误在首次前向时才出现：在这里触发一次，失败即回退
+                compiled = torch.compile(model)
+                self.trial_forward(compiled)
+                model = compiled
+            print(f"⚙️  已启用编译模式: {self.compile_mode}")
+        except Exception as e:
+            print(f"❌ 模型编译失败，回退到 eager 模式: {e}")
+            self.compile_mode = None
         return model
 
+    def trial_forward(self, model, batch_size=1):
+        """按线上相同的内存布局与精度执行一次随机输入前向"""
+        batch = torch.randn(batch_size, *INPUT_SHAPE, device=self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad(), torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                                             enabled=self.bf16):
+            model(batch)
+
+    def fallback_to_eager(self, error):
+        """torch.compile 模型在新的批大小上重新编译失败时换回原始模型"""
+        print(f"❌ 编译模型前向失败，回退到 eager 模式: {error}")
+        self.model = self.model._orig_mod
+        self.compile_mode = None
+
+    def warmup(self, batch_sizes=(1,), repeats=3):
+        """使用随机输入预热各批大小（触发编译），返回每张图像的平均延迟（毫秒）"""
+        mode = self.compile_mode or ("onnx" if self.backend == "onnx" else "eager")
+        report = {}
+        self._warming_up = True
+        try:
+            for batch_size in batch_sizes:
+                dummy = [torch.randn(3, 224, 224) for _ in range(batch_size)]
+
+                begin = time.perf_counter()
+                try:
+                    self.forward_batch(dummy)
+                except Exception as e:
+                    if self.compile_mode != "compile" or not hasattr(self.model, "_orig_mod"):
+                        raise
+                    self.fallback_to_eager(e)
+                    mode = "eager"
+                    self.forward_batch(dummy)
+                first_ms = (time.perf_counter() - begin) * 1000
+
+                begin = time.perf_counter()
+                for _ in range(repeats):
+                    self.forward_batch(dummy)
+                latency_ms = (time.perf_counter() - begin) * 1000 / repeats / batch_size
+
+                report[batch_size] = latency_ms
+                print(f"🔥 预热 [{mode}] batch={batch_size}: 首次 {first_ms:.1f}ms, 平均 {latency_ms:.2f}ms/张")
+        finally:
+            self._warming_up = False
+        return report
+
+    def compute_model_version(self, model_path):
+        """根据权重文件路径、大小和修改时间生成模型版本标识"""
+        if model_path and os.path.exists(model_path):
+            stat = os.stat(model_path)
+            raw = f"{os.path.abspath(model_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+        else:
+            raw = f"random-init:{id(self.model)}"
+        raw += f":{self.backend}:" + ("int8" if self.quantize else "bf16" if self.bf16 else "fp32")
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()[:12]
+
+    def reload_weights(self, model_path):
+        """重新加载模型权重，并使结果缓存失效"""
+        if self.backend == "onnx":
+            self.onnx_runner = OnnxRunner(model_path)
+        else:
+            self.model = self.load_model(model_path)
+            if self.compile_mode:
+                self.model = self.compile_model(self.model)
+            if self.profiler is not None:
+                self.profiler.stop()
+                self.profiler = None
+        self.model_version = self.compute_model_version(model_path)
+        if self.exit_threshold and not self.supports_early_exit:
+            print("⚠️  新模型未加载早退辅助头，已关闭早退推理")
+            self.exit_threshold = 0.0
+        if self.exit_threshold:
+            self.set_exit_threshold(self.exit_threshold)
+        if self.cache is not None:
+            self.cache.set_model_version(self.cache_version)
+
+    @property
+    def supports_early_exit(self):
+        """需要已加载辅助头的 PyTorch 模型；ONNX 与 TorchScript（trace）模型只导出了完整的 forward"""
+        return (self.model is not None and hasattr(self.model, "forward_early_exit")
+                and len(self.model.exit_heads) > 0)
+
+    @property
+    def cache_version(self):
+        """早退会改变识别结果，缓存键中同时区分模型版本与早退阈值"""
+        return f"{self.model_version}/exit{self.exit_threshold:g}" if self.exit_threshold else self.model_version
+
+    def set_exit_threshold(self, threshold):
+        """运行时调整早退置信度阈值（0 表示关闭），阈值变化后结果缓存失效"""
+        threshold = float(threshold)
+        if not 0 <= threshold <= 1:
+            raise ValueError("早退阈值需在 0 到 1 之间")
+        if threshold and not self.supports_early_exit:
+            raise ValueError("当前模型未加载早退辅助头，或推理后端不支持早退")
+        if self.model is not None and hasattr(self.model, "forward_early_exit"):
+            # torch.compile 包装后的模型需设置到原始模块上
+            getattr(self.model, "_orig_mod", self.model).exit_threshold = threshold or None
+        self.exit_threshold = threshold
+        with self._exit_lock:
+            self.exit_counts = {}
+        if self.cache is not None:
+            self.cache.set_model_version(self.cache_version)
+
+    def record_exits(self, exit_points):
+        """统计各退出位置的样本数"""
+        final = len(self.model.blocks)
+        counts = {}
+        for point in exit_points.tolist():
+            key = "final" if point == final else f"block{point}"
+            counts[key] = counts.get(key, 0) + 1
+        with self._exit_lock:
+            for key, count in counts.items():
+                self.exit_counts[key] = self.exit_counts.get(key, 0) + count
+        if self.early_exits is not None:
+            for key, count in counts.items():
+                self.early_exits.inc(count, exit=key)
+
+    def early_exit_stats(self):
+        with self._exit_lock:
+            counts = dict(self.exit_counts)
+        total = sum(counts.values())
+        return {
+            "supported": self.supports_early_exit,
+            "threshold": self.exit_threshold,
+            "exit_blocks": [int(key) for key in self.model.exit_heads] if self.supports_early_exit else [],
+            "exits": counts,
+            "exit_rate": {key: count / total for key, count in counts.items()} if total else {}
+        }
+
+    def start_profiling(self, forwards=20):
+        """对接下来 forwards 次前向开启逐层性能剖析（仅支持未编译的 PyTorch 后端）"""
+        if self.model is None or self.compile_mode is not None:
+            raise ValueError("逐层性能剖析仅支持未编译的 PyTorch 后端")
+        if self.profiler is None:
+            self.profiler = ModuleProfiler(self.model)
+        self.profiler.start(forwards)
+
+    def stop_profiling(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def profile_report(self):
+        return self.profiler.report() if self.profiler is not None else None
+
     def load_class_names(self):
         """加载植物类别名称映射"""
         class_file = "../shared/plant_classes.json"
@@ -119,42 +441,327 @@ class PlantRecognitionModel:
             )
         ])
 
-    async def predict(self, image_path, top_k=3):
-        """预测植物类别"""
+    @property
+    def supports_embeddings(self):
+        """ONNX 与 TorchScript（trace）模型只导出了 forward，无法单独取出特征"""
+        return self.model is not None and hasattr(self.model, "forward_features")
+
+    def forward_batch(self, input_tensors, with_features=False):
+        """对一批预处理后的图像张量执行一次前向推理，返回每张图像的概率分布
+
+        with_features=True 时返回 (概率分布, L2 归一化的特征向量) 列表，特征即 head 之前的池化输出
+        """
+        batch_buffer = None
+        if self.batch_pool is not None and len(input_tensors) <= self.batch_pool.shape[0]:
+            batch_buffer = self.batch_pool.acquire()
+            batch = torch.stack(input_tensors, out=batch_buffer[:len(input_tensors)])
+        else:
+            batch = torch.stack(input_tensors)
+        # 样本已拷入批次，单图缓冲区可立即归还
+        self.release_inputs(input_tensors)
+
+        try:
+            return self._forward(batch, with_features)
+        finally:
+            if batch_buffer is not None:
+                self.batch_pool.release(batch_buffer)
+
+    def _forward(self, batch, with_features=False):
+        if with_features and not self.supports_embeddings:
+            raise ValueError("当前推理后端不支持特征提取")
+        with torch.no_grad():
+            if self.onnx_runner is not None:
+                outputs = torch.from_numpy(self.onnx_runner(batch.numpy()))
+            else:
+                batch = batch.to(self.device, non_blocking=batch.is_pinned())
+                if self.channels_last:
+                    batch = batch.contiguous(memory_format=torch.channels_last)
+                # 剖析窗口按调用方计数：特征与早退路径不经过 BryoFormer.forward
+                measure = self.profiler is not None and not self._warming_up
+                profiling = self.profiler.measure() if measure else contextlib.nullcontext()
+                with profiling, torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                                               enabled=self.bf16):
+                    if with_features:
+                        # 与 BryoFormer.forward 相同的计算，只是保留 head 之前的特征（需要走完全部 block，不早退）
+                        features = self.model.forward_features(batch)
+                        outputs = self.model.head(self.model.final_dropout(features))
+                    elif self.exit_threshold:
+                        outputs, exit_points = self.model.forward_early_exit(batch)
+                        if not self._warming_up:
+                            self.record_exits(exit_points)
+                    else:
+                        outputs = self.model(batch)
+                outputs = outputs.float()
+            probabilities = torch.nn.functional.softmax(outputs, dim=1)
+            if with_features:
+                embeddings = torch.nn.functional.normalize(features.float(), dim=1)
+                return list(zip(probabilities.cpu(), embeddings.cpu()))
+        return list(probabilities.cpu())
+
+    def observe_phase(self, phase, seconds):
+        if self.phase_seconds is not None:
+            self.phase_seconds.observe(seconds, phase=phase)
+
+    def release_inputs(self, input_tensors):
+        """把预处理写入的单图缓冲区归还张量池"""
+        if self.sample_pool is not None:
+            for tensor in input_tensors:
+                self.sample_pool.release(tensor)
+
+    async def _run_forward(self, input_tensors, enqueued_at, with_features=False):
+        """在推理执行器中前向；被拒绝（InferenceQueueFull）或排队时被取消则 forward_batch 不会运行，
+        由这里归还输入缓冲区"""
+        lock = threading.Lock()
+        state = {"started": False, "abandoned": False}
+
+        def forward():
+            with lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+            return self._timed_forward_batch(input_tensors, enqueued_at, with_features)
+
+        try:
+            return await self.executor.run(forward)
+        except BaseException:
+            with lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+                    self.release_inputs(input_tensors)
+            raise
+
+    def _timed_forward_batch(self, input_tensors, enqueued_at, with_features=False):
+        """前向推理并记录每张图像的排队等待、批次前向耗时与批大小"""
+        begin = time.perf_counter()
+        for timestamp in enqueued_at:
+            self.observe_phase("queue_wait", begin - timestamp)
+        probabilities = self.forward_batch(input_tensors, with_features)
+        self.observe_phase("forward", time.perf_counter() - begin)
+        if self.batch_sizes is not None:
+            self.batch_sizes.observe(len(input_tensors))
+        return probabilities
+
+    async def _predict_batch(self, items):
+        """批处理调度器回调：items 为 (输入张量, 入队时间, 是否需要特征) 列表"""
+        input_tensors = [tensor for tensor, _, _ in items]
+        enqueued_at = [timestamp for _, timestamp, _ in items]
+        # 批内任一请求需要特征时整批一起提取，特征本就是前向的中间结果
+        with_features = any(flag for _, _, flag in items)
+        outputs = await self._run_forward(input_tensors, enqueued_at, with_features)
+        if with_features:
+            return [output if flag else output[0] for output, (_, _, flag) in zip(outputs, items)]
+        return outputs
+
+    async def _infer(self, input_tensor, with_features=False):
+        """单张图像推理（启用批处理时与其他并发请求合并）"""
+        if self.batch_scheduler is not None:
+            return await self.batch_scheduler.submit((input_tensor, time.perf_counter(), with_features))
+        outputs = await self._run_forward([input_tensor], [time.perf_counter()], with_features)
+        return outputs[0]
+
+    async def embed(self, image_source):
+        """提取图像的 L2 归一化特征向量"""
+        input_tensor = await self._run_preprocess(self.preprocess, image_source)
+        _, embedding = await self._infer(input_tensor, with_features=True)
+        return embedding
+
+    def find_similar(self, embedding, k=5, class_id=None):
+        """在参考图片索引中检索视觉相似的参考照片"""
+        references = []
+        for hit in self.reference_index.search(embedding.numpy(), k, class_id=class_id):
+            info = self.class_names.get(str(hit.get("class_id")), {})
+            references.append({**hit, "name": info.get("name"), "sci_name": info.get("sci_name")})
+        return references
+
+    @staticmethod
+    def load_image(image_source):
+        """加载图像：支持文件路径、原始字节（bytes / bytearray / memoryview）和文件对象"""
+        if isinstance(image_source, (bytes, bytearray, memoryview)):
+            image_source = io.BytesIO(image_source)
+        return Image.open(image_source).convert('RGB')
+
+    def preprocess(self, image_source):
+        """加载图像并转换为模型输入张量（启用张量池时写入池中的缓冲区）"""
+        out = self.sample_pool.acquire() if self.sample_pool is not None else None
+        try:
+            begin = time.perf_counter()
+            if self.fast_preprocessor is not None:
+                image = self.fast_preprocessor.decode(image_source)
+            else:
+                image = self.load_image(image_source)
+            decoded = time.perf_counter()
+
+            if self.fast_preprocessor is not None:
+                tensor = self.fast_preprocessor.to_tensor(image, out=out)
+            elif out is not None:
+                # 与 transform 相同的缩放，归一化直接写入池中的缓冲区，不再生成中间张量
+                tensor = self.tensor_writer.to_tensor(self.transform.transforms[0](image), out=out)
+            else:
+                tensor = self.transform(image)
+            self.observe_phase("decode", decoded - begin)
+            self.observe_phase("preprocess", time.perf_counter() - decoded)
+            return tensor
+        except Exception:
+            if out is not None:
+                self.sample_pool.release(out)
+            raise
+
+    async def _run_preprocess(self, func, image_source):
+        """在预处理阶段（未启用时退回推理执行器）中执行预处理"""
+        if self.preprocess_stage is not None:
+            return await self.preprocess_stage.run(func, image_source)
+        return await self.executor.run(func, image_source)
+
+    def pipeline_stats(self):
+        """各阶段的排队深度与耗时，用于分别确定预处理与推理阶段的容量"""
+        return {
+            "preprocess": self.preprocess_stage.stats() if self.preprocess_stage is not None else None,
+            "batching": self.batch_scheduler.stats() if self.batch_scheduler is not None else None,
+            "tensor_pool": {
+                "samples": self.sample_pool.stats(),
+                "batches": self.batch_pool.stats()
+            } if self.sample_pool is not None else None,
+            "inference": self.executor.stats()
+        }
+
+    def build_predictions(self, probabilities, top_k=3):
+        """根据概率分布构建 top-k 识别结果"""
+        top_probs, top_indices = torch.topk(probabilities, min(top_k, probabilities.numel()))
+
+        results = []
+        for i in range(top_probs.numel()):
+            class_idx = top_indices[i].item()
+            confidence = top_probs[i].item()
+
+            class_key = str(class_idx)
+            if class_key in self.class_names:
+                plant_info = self.class_names[class_key].copy()
+                plant_info["confidence"] = confidence
+                plant_info["class_id"] = class_idx
+                results.append(plant_info)
+        return results
+
+    def _cache_key(self, image_source, top_k):
+        """仅对原始字节输入启用缓存"""
+        if self.cache is None or not self.cache.enabled:
+            return None
+        if not isinstance(image_source, (bytes, bytearray, memoryview)):
+            return None
+        return self.cache.make_key(image_source, top_k)
+
+    async def predict(self, image_source, top_k=3, similar=0):
+        """预测植物类别（image_source 可以是文件路径、原始字节或文件对象）
+
+        similar > 0 且加载了参考图片索引时，结果中附带 similar 张视觉相似的参考照片
+        """
+        similar = similar if self.reference_index is not None and self.supports_embeddings else 0
+        cache_key = self._cache_key(image_source, f"{top_k}/{similar}" if similar else top_k)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         try:
             # 加载和预处理图像
-            image = Image.open(image_path).convert('RGB')
-            input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+            input_tensor = await self._run_preprocess(self.preprocess, image_source)
 
-            # 预测
-            with torch.no_grad():
-                outputs = self.model(input_tensor)
-                probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                top_probs, top_indices = torch.topk(probabilities, top_k)
+            # 预测（启用批处理时与其他并发请求合并）
+            output = await self._infer(input_tensor, with_features=similar > 0)
+            probabilities, embedding = output if similar else (output, None)
 
             # 构建结果
-            results = []
-            for i in range(top_k):
-                class_idx = top_indices[i].item()
-                confidence = top_probs[i].item()
-
-                class_key = str(class_idx)
-                if class_key in self.class_names:
-                    plant_info = self.class_names[class_key].copy()
-                    plant_info["confidence"] = confidence
-                    plant_info["class_id"] = class_idx
-                    results.append(plant_info)
+            results = self.build_predictions(probabilities, top_k)
 
-            return {
+            result = {
                 "success": True,
                 "predictions": results,
                 "top_prediction": results[0] if results else None
             }
+            if similar:
+                # 内存映射的索引检索可能触发缺页读盘，放到执行器中避免阻塞事件循环
+                result["similar_references"] = await self.executor.run(self.find_similar, embedding, similar)
+            if cache_key is not None:
+                self.cache.put(cache_key, result)
+            return result
 
+        except InferenceQueueFull:
+            raise
         except Exception as e:
             print(f"❌ 预测失败: {e}")
             return {
                 "success": False,
                 "error": str(e),
                 "predictions": []
-            }
\ No newline at end of file
+            }
+
+    def _safe_preprocess(self, image_source):
+        """批量识别中单张图像解码失败时返回错误信息而不是中断整个批次"""
+        try:
+            return self.preprocess(image_source), None
+        except Exception as e:
+            return None, str(e)
+
+    async def _preprocess_chunk(self, image_sources):
+        """并行预处理一块图像；等待中被取消（客户端断开、服务关闭）或有请求被拒绝时，
+        已写入张量池的缓冲区不会再送入前向，由这里归还（之后才完成的由工作线程自行归还）"""
+        lock = threading.Lock()
+        state = {"abandoned": False, "tensors": []}
+
+        def preprocess(image_source):
+            tensor, error = self._safe_preprocess(image_source)
+            with lock:
+                if tensor is not None:
+                    if state["abandoned"]:
+                        self.release_inputs([tensor])
+                        return None, "已取消"
+                    state["tensors"].append(tensor)
+            return tensor, error
+
+        try:
+            return await asyncio.gather(*[self._run_preprocess(preprocess, source) for source in image_sources])
+        except BaseException:
+            with lock:
+                state["abandoned"] = True
+                self.release_inputs(state["tensors"])
+            raise
+
+    async def predict_batch(self, image_sources, top_k=3, batch_size=None):
+        """批量预测：分块并行解码，每块执行一次批量前向推理"""
+        batch_size = batch_size or self.max_batch_size
+        outputs = [None] * len(image_sources)
+
+        # 先查缓存，命中的图片无需解码
+        pending = []
+        for index, source in enumerate(image_sources):
+            cache_key = self._cache_key(source, top_k)
+            cached = self.cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                outputs[index] = cached
+            else:
+                pending.append((index, source, cache_key))
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+
+            # 并行解码当前块
+            decoded = await self._preprocess_chunk([source for _, source, _ in chunk])
+            valid = [tensor for tensor, _ in decoded if tensor is not None]
+            enqueued_at = [time.perf_counter()] * len(valid)
+            probabilities = await self._run_forward(valid, enqueued_at) if valid else []
+
+            prob_iter = iter(probabilities)
+            for (index, _, cache_key), (tensor, error) in zip(chunk, decoded):
+                if tensor is None:
+                    print(f"❌ 预测失败: {error}")
+                    outputs[index] = {"success": False, "error": error, "predictions": []}
+                    continue
+                results = self.build_predictions(next(prob_iter), top_k)
+                outputs[index] = {
+                    "success": True,
+                    "predictions": results,
+                    "top_prediction": results[0] if results else None
+                }
+                if cache_key is not None:
+                    self.cache.put(cache_key, outputs[index])
+
+        return outputs
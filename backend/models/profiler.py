@@ -0,0 +1,201 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+import torch.nn as nn
+
+from backend.models.bryoFormer import OSRAttention, SpectralGatingNetwork
+
+
+def _tensor_bytes(output):
+    """输出激活占用的字节数（支持张量、元组与列表）"""
+    if isinstance(output, torch.Tensor):
+        return output.numel() * output.element_size()
+    if isinstance(output, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in output)
+    return 0
+
+
+def estimate_flops(module, inputs, output):
+    """估算单个叶子模块一次前向的浮点运算数（乘加计为 2 次），无法估算的模块返回 0"""
+    if isinstance(module, nn.Conv2d):
+        kh, kw = module.kernel_size
+        return 2 * (module.in_channels // module.groups) * kh * kw * output.numel()
+    if isinstance(module, nn.Linear) or type(module).__name__ == "Linear":
+        # 兼容动态量化后的 Linear
+        return 2 * module.in_features * output.numel()
+    if isinstance(module, SpectralGatingNetwork):
+        x = inputs[0]
+        B, N, C = x.shape
+        if module.strategy == "conv" and not module.training:
+            # 深度可分离循环卷积，核大小等于整个 token 网格
+            return 2 * B * C * N * N
+        # rfft2 + irfft2（约 2.5 N log2 N / 通道）与复数逐元素相乘
+        filter_size = module.complex_weight.shape[0] * module.complex_weight.shape[1]
+        return int(2 * 2.5 * B * C * N * math.log2(max(N, 2)) + 6 * B * C * filter_size)
+    if isinstance(module, OSRAttention):
+        # 只计注意力矩阵的两次矩阵乘，q / kv / local_conv 由其中的卷积单独计入
+        B, C, H, W = inputs[0].shape
+        sr = module.sr_ratio
+        kv_tokens = (H // sr) * (W // sr) if sr > 1 else H * W
+        return 4 * B * H * W * kv_tokens * C
+    return 0
+
+
+class ModuleStats:
+    def __init__(self, name, module_type, depth):
+        self.name = name
+        self.module_type = module_type
+        self.depth = depth
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.flops = 0
+        self.activation_bytes = 0
+        self.peak_activation_bytes = 0
+
+    def report(self, forwards, root_ms):
+        per_forward = max(forwards, 1)
+        avg_ms = self.total_ms / per_forward
+        return {
+            "name": self.name,
+            "type": self.module_type,
+            "depth": self.depth,
+            "calls": self.calls,
+            "ms_per_forward": avg_ms,
+            "max_ms": self.max_ms,
+            "share": avg_ms / root_ms if root_ms else 0.0,
+            "gflops_per_forward": self.flops / per_forward / 1e9,
+            "activation_mb_per_forward": self.activation_bytes / per_forward / 2 ** 20,
+            "peak_activation_mb": self.peak_activation_bytes / 2 ** 20
+        }
+
+
+class ModuleProfiler:
+    """逐层性能剖析：通过前向钩子记录每个 block 及其子模块的耗时、FLOPs 估算与激活内存
+
+    仅在采样窗口内挂载钩子，窗口结束后自动卸载，未启用时对推理没有任何开销。
+    整次前向的耗时与计数由调用方用 measure() 包住前向记录，不依赖模型的 forward 入口
+    （forward_features、forward_early_exit 等路径不会经过 BryoFormer.__call__）。
+    """
+
+    def __init__(self, model, max_depth=2):
+        self.model = model
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._handles = []
+        self._starts = {}
+        self.stats = {}
+        self.window = 0
+        self.forwards = 0
+        self.root_ms = 0.0
+        self.synchronize = next(model.parameters()).is_cuda
+
+    @property
+    def active(self):
+        return bool(self._handles)
+
+    def _timed_modules(self):
+        """需要计时的模块：模型顶层子模块、blocks 中的每个 block 以及 block 的直接子模块"""
+        for name, module in self.model.named_modules():
+            if not name or isinstance(module, (nn.ModuleList, nn.Identity, nn.Dropout)):
+                continue
+            parts = name.split(".")
+            depth = len(parts) - 1 if parts[0] == "blocks" else len(parts)
+            if depth <= self.max_depth:
+                yield name, module, depth
+
+    def start(self, forwards=20):
+        """挂载钩子，采集接下来 forwards 次模型前向"""
+        self.stop()
+        self.stats = {}
+        self.window = max(1, int(forwards))
+        self.forwards = 0
+        self.root_ms = 0.0
+
+        for name, module, depth in self._timed_modules():
+            self.stats[name] = ModuleStats(name, type(module).__name__, depth)
+            self._handles.append(module.register_forward_pre_hook(self._make_pre_hook(name)))
+            self._handles.append(module.register_forward_hook(self._make_post_hook(name)))
+
+        # FLOPs 在叶子模块上估算，再累加到所有被计时的祖先模块
+        for name, module in self.model.named_modules():
+            if isinstance(module, (nn.Conv2d, SpectralGatingNetwork, OSRAttention)) or \
+                    isinstance(module, nn.Linear) or type(module).__name__ == "Linear":
+                ancestors = [prefix for prefix in self.stats if name == prefix or name.startswith(prefix + ".")]
+                if ancestors:
+                    self._handles.append(module.register_forward_hook(self._make_flop_hook(ancestors)))
+
+    def stop(self):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self._starts = {}
+
+    def _now(self):
+        if self.synchronize:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def _make_pre_hook(self, name):
+        def hook(module, inputs):
+            key = (name, threading.get_ident())
+            self._starts.setdefault(key, []).append(self._now())
+        return hook
+
+    def _elapsed_ms(self, name):
+        starts = self._starts.get((name, threading.get_ident()))
+        if not starts:
+            return None
+        return (self._now() - starts.pop()) * 1000
+
+    def _make_post_hook(self, name):
+        def hook(module, inputs, output):
+            elapsed = self._elapsed_ms(name)
+            if elapsed is None:
+                return
+            activation = _tensor_bytes(output)
+            with self._lock:
+                stats = self.stats[name]
+                stats.calls += 1
+                stats.total_ms += elapsed
+                stats.max_ms = max(stats.max_ms, elapsed)
+                stats.activation_bytes += activation
+                stats.peak_activation_bytes = max(stats.peak_activation_bytes, activation)
+        return hook
+
+    def _make_flop_hook(self, ancestors):
+        def hook(module, inputs, output):
+            flops = estimate_flops(module, inputs, output)
+            with self._lock:
+                for name in ancestors:
+                    self.stats[name].flops += flops
+        return hook
+
+    @contextmanager
+    def measure(self):
+        """包住一次模型前向（任意入口），计入采样窗口；窗口采满后卸载钩子"""
+        if not self.active:
+            yield
+            return
+        begin = self._now()
+        yield
+        elapsed = (self._now() - begin) * 1000
+        with self._lock:
+            self.forwards += 1
+            self.root_ms += elapsed
+            finished = self.forwards >= self.window
+        if finished:
+            self.stop()
+
+    def report(self):
+        root_ms = self.root_ms / self.forwards if self.forwards else 0.0
+        return {
+            "active": self.active,
+            "window": self.window,
+            "forwards": self.forwards,
+            "ms_per_forward": root_ms,
+            "modules": [stats.report(self.forwards, root_ms) for stats in self.stats.values() if stats.calls]
+        }
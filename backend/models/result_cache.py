@@ -0,0 +1,95 @@
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """识别结果缓存：按上传内容哈希 + 模型版本索引，LRU 淘汰并支持过期时间"""
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, ttl_seconds=3600, model_version=""):
+        self.max_entries = int(max_entries)
+        self.max_bytes = int(max_bytes)
+        self.ttl = float(ttl_seconds) if ttl_seconds else None
+        self.model_version = model_version
+
+        # key -> (过期时间, 结果大小, 结果)
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def make_key(self, content, top_k):
+        """对原始字节做快速哈希，结合模型版本与 top_k 生成缓存键"""
+        digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+        return f"{self.model_version}:{top_k}:{digest}"
+
+    def set_model_version(self, model_version):
+        """模型权重变化时清空缓存"""
+        if model_version != self.model_version:
+            self.model_version = model_version
+            self.clear()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, size, result = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(result)
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        size = len(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, size, copy.deepcopy(result))
+        self.current_bytes += size
+
+        # 超出条目数或字节上限时淘汰最久未使用的结果
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,59 @@
+import threading
+import weakref
+
+import torch
+
+
+class TensorPool:
+    """预分配张量池：重复使用固定形状的输入缓冲区，减少分配器抖动与常驻内存波动"""
+
+    def __init__(self, shape, capacity, dtype=torch.float32, pin_memory=None):
+        self.shape = tuple(shape)
+        self.capacity = max(0, int(capacity))
+        self.dtype = dtype
+        # 页锁定内存仅在有 CUDA 时可用，可加速拷贝到 GPU
+        self.pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self._lock = threading.Lock()
+        # 只回收由本池分配的张量，避免把调用方仍在使用的张量当作空闲缓冲区
+        self._owned = weakref.WeakValueDictionary()
+        self._free = [self._allocate() for _ in range(self.capacity)]
+        self._free_ids = {id(tensor) for tensor in self._free}
+
+        # 统计信息
+        self.acquired = 0
+        self.misses = 0
+
+    def _allocate(self):
+        tensor = torch.empty(self.shape, dtype=self.dtype, pin_memory=self.pin_memory)
+        self._owned[id(tensor)] = tensor
+        return tensor
+
+    def acquire(self):
+        """取出一个缓冲区；池已空时临时分配新张量，不阻塞调用方"""
+        with self._lock:
+            self.acquired += 1
+            if self._free:
+                tensor = self._free.pop()
+                self._free_ids.discard(id(tensor))
+                return tensor
+            self.misses += 1
+            return self._allocate()
+
+    def release(self, tensor):
+        """归还缓冲区；非本池分配、重复归还或池已满时直接丢弃"""
+        with self._lock:
+            if self._owned.get(id(tensor)) is not tensor:
+                return
+            if len(self._free) < self.capacity and id(tensor) not in self._free_ids:
+                self._free.append(tensor)
+                self._free_ids.add(id(tensor))
+
+    def stats(self):
+        return {
+            "shape": list(self.shape),
+            "capacity": self.capacity,
+            "available": len(self._free),
+            "pinned": self.pin_memory,
+            "acquired": self.acquired,
+            "misses": self.misses
+        }
@@ -0,0 +1,247 @@
+import json
+import os
+
+import numpy as np
+
+# 索引目录中的文件：向量、倒排列表编号与类别均为追加写入的原始数组，可直接内存映射
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.f32"
+LISTS_FILE = "lists.i32"
+LABELS_FILE = "labels.i32"
+CENTROIDS_FILE = "centroids.f32"
+METADATA_FILE = "metadata.jsonl"
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _write_atomic(path, write):
+    """先写临时文件再替换：已内存映射的旧文件不会被截断"""
+    temp_path = path + ".tmp"
+    write(temp_path)
+    os.replace(temp_path, path)
+
+
+def spherical_kmeans(data, k, iterations=10, seed=0):
+    """余弦相似度下的 k-means，返回单位长度的聚类中心 [k, dim]"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(data @ centroids.T, axis=1)
+        for j in range(k):
+            members = data[assignments == j]
+            # 空簇重新随机选取一个样本作为中心
+            centroids[j] = members.sum(axis=0) if len(members) else data[rng.integers(len(data))]
+        centroids = normalize(centroids)
+    return centroids
+
+
+class VectorIndex:
+    """IVF 近似最近邻索引（余弦相似度）：向量存于 NumPy 矩阵，可持久化、内存映射与增量追加
+
+    训练前对全部向量做精确搜索；向量数达到 nlist * TRAIN_FACTOR 时自动训练聚类中心，
+    之后新增向量只需分配到最近的倒排列表并追加写入，无需重建索引。
+    """
+
+    TRAIN_FACTOR = 32
+
+    def __init__(self, dim, nlist=64, nprobe=8, model_version=""):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.model_version = model_version
+        self.centroids = None
+        # 已持久化部分（加载时可为内存映射）与尚未保存的增量部分
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._labels = np.empty(0, dtype=np.int32)
+        self._delta = []
+        self.metadata = []
+        self._saved_count = 0
+        self._metadata_bytes = 0
+        self._rewrite = True
+        self._inverted = None
+
+    @property
+    def count(self):
+        return len(self.metadata)
+
+    @property
+    def trained(self):
+        return self.centroids is not None
+
+    def _consolidate(self):
+        """把增量部分并入内存矩阵（仅在训练或整体重写时调用）"""
+        if self._delta:
+            vectors, lists, labels = zip(*self._delta)
+            self._vectors = np.concatenate([np.asarray(self._vectors), *vectors])
+            self._lists = np.concatenate([np.asarray(self._lists), *lists])
+            self._labels = np.concatenate([np.asarray(self._labels), *labels])
+            self._delta = []
+
+    def _assign(self, vectors):
+        if not self.trained:
+            return np.full(len(vectors), -1, dtype=np.int32)
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def train(self, iterations=10, max_samples=50000, seed=0):
+        """训练聚类中心并重新分配全部向量（下次保存时整体重写倒排列表）"""
+        self._consolidate()
+        nlist = min(self.nlist, self.count)
+        if nlist == 0:
+            return
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(self._vectors)
+        if len(sample) > max_samples:
+            sample = sample[rng.choice(len(sample), max_samples, replace=False)]
+        self.nlist = nlist
+        self.centroids = spherical_kmeans(sample, nlist, iterations, seed)
+        self._lists = self._assign(np.asarray(self._vectors))
+        self._rewrite = True
+        self._inverted = None
+
+    def add(self, vectors, metadata):
+        """追加向量及其元数据（如 class_id、path），返回新向量的编号"""
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        if len(vectors) != len(metadata):
+            raise ValueError("向量数量与元数据数量不一致")
+        start = self.count
+        labels = np.array([item.get("class_id", -1) for item in metadata], dtype=np.int32)
+        self._delta.append((vectors, self._assign(vectors), labels))
+        self.metadata.extend(metadata)
+        self._inverted = None
+        if not self.trained and self.count >= self.nlist * self.TRAIN_FACTOR:
+            self.train()
+        return list(range(start, self.count))
+
+    def _rows(self, indices):
+        """按编号取向量：已持久化部分从（可能内存映射的）矩阵读取，其余来自增量部分"""
+        base = len(self._vectors)
+        if not self._delta:
+            return np.asarray(self._vectors[indices])
+        delta = np.concatenate([vectors for vectors, _, _ in self._delta])
+        rows = np.empty((len(indices), self.dim), dtype=np.float32)
+        in_base = indices < base
+        rows[in_base] = self._vectors[indices[in_base]]
+        rows[~in_base] = delta[indices[~in_base] - base]
+        return rows
+
+    def _all(self, name):
+        arrays = [np.asarray(getattr(self, name))]
+        position = {"_lists": 1, "_labels": 2}[name]
+        arrays.extend(item[position] for item in self._delta)
+        return np.concatenate(arrays)
+
+    def _inverted_lists(self):
+        """按倒排列表编号排序后的向量编号及每个列表的起止位置"""
+        if self._inverted is None:
+            lists = self._all("_lists")
+            order = np.argsort(lists, kind="stable")
+            offsets = np.searchsorted(lists[order], np.arange(self.nlist + 1))
+            self._inverted = (order, offsets)
+        return self._inverted
+
+    def search(self, query, k=5, nprobe=None, class_id=None):
+        """返回与 query 最相似的 k 个向量：[{"id", "score", **metadata}]"""
+        if self.count == 0:
+            return []
+        query = normalize(query).reshape(self.dim)
+        if self.trained:
+            order, offsets = self._inverted_lists()
+            probe = np.argsort(-(self.centroids @ query))[:nprobe or self.nprobe]
+            candidates = np.concatenate([order[offsets[j]:offsets[j + 1]] for j in probe])
+        else:
+            candidates = np.arange(self.count)
+        if class_id is not None:
+            candidates = candidates[self._all("_labels")[candidates] == class_id]
+        if len(candidates) == 0:
+            return []
+
+        # 按编号顺序读取，内存映射时访问更连续
+        candidates = np.sort(candidates)
+        scores = self._rows(candidates) @ query
+        top = np.argsort(-scores)[:k] if len(scores) <= k else np.argpartition(-scores, k)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{"id": int(candidates[i]), "score": float(scores[i]), **self.metadata[candidates[i]]} for i in top]
+
+    def save(self, path):
+        """持久化：首次保存或重新训练后整体写入，其余情况只追加新增部分"""
+        os.makedirs(path, exist_ok=True)
+        if self._rewrite:
+            self._consolidate()
+            for name, array, dtype in ((VECTORS_FILE, self._vectors, np.float32),
+                                       (LISTS_FILE, self._lists, np.int32),
+                                       (LABELS_FILE, self._labels, np.int32)):
+                data = np.array(array, dtype=dtype)
+                _write_atomic(os.path.join(path, name), data.tofile)
+
+            def write_metadata(temp_path):
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(item, ensure_ascii=False) + "\n" for item in self.metadata)
+
+            _write_atomic(os.path.join(path, METADATA_FILE), write_metadata)
+        else:
+            # 先截断到已提交的长度，丢弃上次追加中途崩溃残留的数据，再追加新增部分
+            for name, position, row_bytes in ((VECTORS_FILE, 0, 4 * self.dim), (LISTS_FILE, 1, 4),
+                                              (LABELS_FILE, 2, 4)):
+                with open(os.path.join(path, name), "r+b") as f:
+                    f.truncate(self._saved_count * row_bytes)
+                    f.seek(0, os.SEEK_END)
+                    for item in self._delta:
+                        item[position].tofile(f)
+            with open(os.path.join(path, METADATA_FILE), "r+b") as f:
+                f.truncate(self._metadata_bytes)
+                f.seek(0, os.SEEK_END)
+                f.writelines((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+                             for item in self.metadata[self._saved_count:])
+        self._metadata_bytes = os.path.getsize(os.path.join(path, METADATA_FILE))
+        if self.trained:
+            _write_atomic(os.path.join(path, CENTROIDS_FILE), self.centroids.astype(np.float32).tofile)
+
+        # 最后写入 index.json：其中的 count 之后的数据对读取方不可见，追加过程中崩溃也不会损坏索引
+        with open(os.path.join(path, INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "nlist": self.nlist, "nprobe": self.nprobe,
+                       "trained": self.trained, "metric": "cosine", "model_version": self.model_version}, f,
+                      ensure_ascii=False, indent=2)
+
+        if isinstance(self._vectors, np.memmap):
+            # 保持内存映射：重新映射包含新增向量的文件，而不是把整个矩阵读入内存
+            self._lists = self._all("_lists")
+            self._labels = self._all("_labels")
+            self._delta = []
+            self._vectors = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r",
+                                      shape=(self.count, self.dim))
+        else:
+            self._consolidate()
+        self._saved_count = self.count
+        self._rewrite = False
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """加载索引；mmap=True 时向量矩阵以只读内存映射方式打开，多进程间共享页缓存"""
+        with open(os.path.join(path, INDEX_FILE), encoding="utf-8") as f:
+            info = json.load(f)
+        index = cls(info["dim"], nlist=info["nlist"], nprobe=info["nprobe"], model_version=info["model_version"])
+        count, dim = info["count"], info["dim"]
+
+        def read(name, dtype, shape):
+            if count == 0:
+                return np.empty(shape, dtype=dtype)
+            if mmap:
+                return np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=shape)
+            return np.fromfile(os.path.join(path, name), dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+        index._vectors = read(VECTORS_FILE, np.float32, (count, dim))
+        index._lists = np.fromfile(os.path.join(path, LISTS_FILE), dtype=np.int32, count=count)
+        index._labels = np.fromfile(os.path.join(path, LABELS_FILE), dtype=np.int32, count=count)
+        if info["trained"]:
+            index.centroids = np.fromfile(os.path.join(path, CENTROIDS_FILE), dtype=np.float32).reshape(-1, dim)
+        with open(os.path.join(path, METADATA_FILE), "rb") as f:
+            index.metadata = [json.loads(f.readline()) for _ in range(count)]
+            index._metadata_bytes = f.tell()
+        index._saved_count = count
+        index._rewrite = False
+        return index
@@ -0,0 +1,112 @@
+"""pre-fork 多进程服务：父进程只加载一次 BryoFormer 并放入共享内存，fork 出的 worker 直接复用
+
+用法（仅支持 Linux / macOS 等提供 os.fork 的系统）:
+    python -m backend.serve --workers 4 --threads-per-worker 4 --port 8000
+
+各 worker 共享同一个监听套接字，模型参数不随 worker 数量复制。
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import traceback
+
+import torch
+import uvicorn
+
+import backend.main as server
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock, index, threads):
+    """子进程：设置本 worker 的 torch 线程数后启动 uvicorn，模型在 startup 中复用共享参数"""
+    server.TORCH_THREADS = threads
+    torch.set_num_threads(threads)
+    print(f"👷 worker {index} 启动 (pid {os.getpid()}, torch 线程 {threads})")
+    config = uvicorn.Config(server.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    cpu_count = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="青芜识界 pre-fork 多进程服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PLANT_WORKERS", cpu_count)))
+    parser.add_argument("--threads-per-worker", type=int, default=int(os.getenv("PLANT_THREADS_PER_WORKER", "0")),
+                        help="每个 worker 的 torch intra-op 线程数，0 表示按 CPU 核数均分")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        raise SystemExit("❌ 当前系统不支持 fork，请直接使用 uvicorn 启动")
+
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, cpu_count // workers)
+
+    # 父进程保持单线程：libgomp 在使用过线程池后 fork 并不安全
+    torch.set_num_threads(1)
+    server.TORCH_THREADS = 1
+
+    # 父进程加载一次模型（编译在各 worker 中进行），参数移入共享内存
+    print("🚀 父进程加载共享模型...")
+    shared = server.create_plant_model(compile_mode=None)
+    if shared.model is not None:
+        # 内存映射的快速权重已在页缓存中，fork 后按写时复制共享；share_memory() 会把它们再复制到共享内存段
+        if not shared.mmap_weights:
+            shared.model.share_memory()
+        server.preloaded_model = shared.model
+    shared.executor.shutdown()
+    if shared.preprocess_stage is not None:
+        shared.preprocess_stage.shutdown()
+    del shared
+
+    sock = bind_socket(args.host, args.port)
+    print(f"🌐 pre-fork 服务: http://{args.host}:{args.port} ({workers} 个 worker, 每个 {threads} 线程)")
+
+    children = []
+    for index in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            # 启动或运行中抛出异常的 worker 以非零状态退出，父进程据此返回失败
+            exit_code = 1
+            try:
+                run_worker(sock, index, threads)
+                exit_code = 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                os._exit(exit_code)
+        children.append(pid)
+
+    def forward_signal(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    # 终端 Ctrl+C 会把 SIGINT 发给整个进程组，worker 自行处理；SIGTERM 由父进程转发
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, forward_signal)
+
+    exit_code = 0
+    for pid in children:
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            exit_code = 1
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
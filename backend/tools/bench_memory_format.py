@@ -0,0 +1,90 @@
+"""内存布局与精度基准：比较 NCHW float32、channels_last float32 与 channels_last + bfloat16 的推理延迟
+
+用法:
+    python -m backend.tools.bench_memory_format --weights backend/models/weights/epoch_35_best.pth \
+        --batch-sizes 1 8 32 --threads 16
+"""
+import argparse
+import json
+import statistics
+import time
+
+import torch
+
+from backend.models.plant_model import PlantRecognitionModel
+
+MODES = {
+    "nchw_fp32": {},
+    "channels_last_fp32": {"channels_last": True},
+    "channels_last_bf16": {"channels_last": True, "bf16": True},
+}
+
+
+def time_batch(recognizer, batch, repeats):
+    """返回每张图像的延迟中位数（毫秒）与最后一次的概率输出"""
+    recognizer.forward_batch(batch)  # 预热
+    samples = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        probabilities = recognizer.forward_batch(batch)
+        samples.append((time.perf_counter() - begin) * 1000 / len(batch))
+    return statistics.median(samples), torch.stack(probabilities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BryoFormer 内存布局与精度基准")
+    parser.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--num-classes", type=int, default=44)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op 线程数，0 表示默认")
+    parser.add_argument("--output", help="结果输出路径（JSON），默认打印到标准输出")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    recognizers = {}
+    for name, options in MODES.items():
+        torch.manual_seed(0)  # 未找到权重时保证各模式随机初始化一致
+        recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes,
+                                           device=torch.device("cpu"), fuse=True, **options)
+        if options.get("bf16") and not recognizer.bf16:
+            continue
+        recognizers[name] = recognizer
+
+    results = []
+    for batch_size in args.batch_sizes:
+        batch = [torch.randn(3, 224, 224) for _ in range(batch_size)]
+        baseline = None
+        for name, recognizer in recognizers.items():
+            latency, probabilities = time_batch(recognizer, batch, args.repeats)
+            if baseline is None:
+                baseline = (latency, probabilities)
+            row = {
+                "mode": name,
+                "batch_size": batch_size,
+                "latency_ms_per_image": latency,
+                "speedup": baseline[0] / latency,
+                "max_prob_diff": float((probabilities - baseline[1]).abs().max()),
+            }
+            results.append(row)
+            print(f"⏱️  {name:<20} batch={batch_size:<3} {latency:.2f}ms/张  "
+                  f"加速 {row['speedup']:.2f}x  概率最大偏差 {row['max_prob_diff']:.1e}")
+
+    report = {
+        "torch_threads": torch.get_num_threads(),
+        "cpu_capability": torch.backends.cpu.get_cpu_capability(),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已保存: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
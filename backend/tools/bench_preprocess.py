@@ -0,0 +1,96 @@
+"""预处理基准：比较 get_transform 流水线与 FastPreprocessor 在真实手机照片上的耗时与输出差异
+
+用法:
+    python -m backend.tools.bench_preprocess --images path/to/phone_photos --output preprocess.json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from backend.models.preprocess import FastPreprocessor, IMAGENET_MEAN, IMAGENET_STD
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def baseline_transform():
+    """与 PlantRecognitionModel.get_transform 相同的流水线"""
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD)
+    ])
+
+
+def time_call(func, repeats):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - begin) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像预处理基准")
+    parser.add_argument("--images", required=True, help="手机照片目录")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="结果输出路径（JSON），默认打印到标准输出")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.images, name) for name in os.listdir(args.images)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if not paths:
+        raise SystemExit(f"❌ 未在 {args.images} 中找到图片")
+
+    transform = baseline_transform()
+    fast = FastPreprocessor()
+    out = torch.empty(3, 224, 224)
+
+    results = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        with Image.open(path) as image:
+            megapixels = image.size[0] * image.size[1] / 1e6
+
+        baseline_ms, expected = time_call(lambda: transform(Image.open(path).convert("RGB")), args.repeats)
+        fast_ms, actual = time_call(lambda: fast(content, out=out), args.repeats)
+        row = {
+            "image": os.path.basename(path),
+            "megapixels": round(megapixels, 2),
+            "baseline_ms": baseline_ms,
+            "fast_ms": fast_ms,
+            "speedup": baseline_ms / fast_ms,
+            "mean_abs_diff": float((expected - actual).abs().mean()),
+        }
+        results.append(row)
+        print(f"⏱️  {row['image']:<30} {megapixels:5.1f}MP  原流程 {baseline_ms:7.1f}ms  "
+              f"快速 {fast_ms:6.1f}ms  加速 {row['speedup']:.1f}x  平均偏差 {row['mean_abs_diff']:.3f}")
+
+    report = {
+        "images": len(results),
+        "baseline_ms_median": statistics.median(r["baseline_ms"] for r in results),
+        "fast_ms_median": statistics.median(r["fast_ms"] for r in results),
+        "results": results,
+    }
+    report["speedup"] = report["baseline_ms_median"] / report["fast_ms_median"]
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已保存: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
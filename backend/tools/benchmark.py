@@ -0,0 +1,343 @@
+"""基准测试套件：模型前向、端到端 predict 与 HTTP 服务的延迟 / 吞吐，输出 JSON 便于版本间对比
+
+用法:
+    # (a) BryoFormer 原始前向：不同批大小与线程数
+    python -m backend.tools.benchmark forward --weights backend/models/weights/epoch_35_best.pth \
+        --batch-sizes 1 8 32 --threads 1 4 8 --output forward.json
+
+    # (b) PlantRecognitionModel.predict 端到端（含解码与预处理）
+    python -m backend.tools.benchmark predict --images path/to/photos --requests 200 --concurrency 8
+
+    # (c) 本地服务 /api/identify 的吞吐与延迟分位数
+    python -m backend.tools.benchmark http --url http://localhost:8000 --images path/to/photos \
+        --requests 500 --concurrency 16
+
+    # 对比两次结果，延迟变慢超过容差时以非零状态退出
+    python -m backend.tools.benchmark compare baseline.json current.json --tolerance 0.1
+"""
+import argparse
+import asyncio
+import http.client
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backend.models.plant_model import PlantRecognitionModel
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {}
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": pick(0.50),
+        "p90_ms": pick(0.90),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1]
+    }
+
+
+def environment():
+    """记录运行环境，便于判断两次结果是否可比"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "cpu_capability": torch.backends.cpu.get_cpu_capability()
+    }
+
+
+def load_images(directory):
+    """读取目录中的图片字节；未指定目录时生成一张 1600x1200 的合成 JPEG"""
+    if directory:
+        images = []
+        for name in sorted(os.listdir(directory)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                with open(os.path.join(directory, name), "rb") as f:
+                    images.append((name, f.read()))
+        if not images:
+            raise SystemExit(f"❌ 未在 {directory} 中找到图片")
+        return images
+
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(small).resize((1600, 1200), Image.BICUBIC).save(buffer, "JPEG", quality=90)
+    return [("synthetic.jpg", buffer.getvalue())]
+
+
+def build_recognizer(args, **options):
+    return PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"),
+                                 fuse=args.fuse, **options)
+
+
+def bench_forward(args):
+    """(a) BryoFormer 原始前向：不经过预处理与批处理调度"""
+    recognizer = build_recognizer(args)
+    model = recognizer.model
+    results = []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for batch_size in args.batch_sizes:
+            batch = torch.randn(batch_size, 3, 224, 224)
+            samples = []
+            with torch.no_grad():
+                for _ in range(args.warmup):
+                    model(batch)
+                for _ in range(args.repeats):
+                    begin = time.perf_counter()
+                    model(batch)
+                    samples.append((time.perf_counter() - begin) * 1000)
+            row = {"threads": threads, "batch_size": batch_size, **percentiles(samples)}
+            row["images_per_second"] = batch_size * 1000 / row["p50_ms"]
+            results.append(row)
+            print(f"⏱️  threads={threads:<3} batch={batch_size:<3} p50 {row['p50_ms']:8.2f}ms  "
+                  f"p95 {row['p95_ms']:8.2f}ms  {row['images_per_second']:7.1f} 张/秒")
+    return results
+
+
+def bench_predict(args):
+    """(b) predict 端到端：解码、预处理、动态批处理与前向（不启用结果缓存）"""
+    if args.threads:
+        torch.set_num_threads(args.threads[0])
+    recognizer = build_recognizer(args, max_batch_size=args.max_batch_size,
+                                  fast_preprocess=args.fast_preprocess,
+                                  preprocess_workers=args.preprocess_workers)
+    images = load_images(args.images)
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        samples = []
+
+        async def one(index):
+            _, content = images[index % len(images)]
+            async with semaphore:
+                begin = time.perf_counter()
+                result = await recognizer.predict(content)
+                samples.append((time.perf_counter() - begin) * 1000)
+                return result["success"]
+
+        for index in range(args.warmup):
+            await one(index)
+        samples.clear()
+        begin = time.perf_counter()
+        outcomes = await asyncio.gather(*[one(index) for index in range(args.requests)])
+        elapsed = time.perf_counter() - begin
+        return samples, outcomes, elapsed
+
+    samples, outcomes, elapsed = asyncio.run(run())
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "max_batch_size": args.max_batch_size,
+        "errors": sum(1 for ok in outcomes if not ok),
+        "throughput_rps": args.requests / elapsed,
+        **percentiles(samples)
+    }
+    print(f"⏱️  predict: {result['throughput_rps']:.1f} 次/秒  p50 {result['p50_ms']:.1f}ms  "
+          f"p95 {result['p95_ms']:.1f}ms  p99 {result['p99_ms']:.1f}ms")
+    return result
+
+
+def encode_multipart(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/jpeg\r\n\r\n").encode("utf-8") + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def bench_http(args):
+    """(c) HTTP：每个并发线程复用一条 keep-alive 连接向 /api/identify 发送请求"""
+    url = urlparse(args.url)
+    images = [encode_multipart(name, content) for name, content in load_images(args.images)]
+    local = threading.local()
+    counter = iter(range(args.requests))
+    lock = threading.Lock()
+
+    def post(index):
+        if not hasattr(local, "conn"):
+            local.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=args.timeout)
+        body, content_type = images[index % len(images)]
+        begin = time.perf_counter()
+        try:
+            local.conn.request("POST", "/api/identify", body=body, headers={"Content-Type": content_type})
+            response = local.conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            local.conn.close()
+            del local.conn
+            status = None
+        return status, (time.perf_counter() - begin) * 1000
+
+    def worker():
+        records = []
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return records
+            records.append((index, *post(index)))
+
+    for index in range(args.warmup):
+        post(index)
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        futures = [pool.submit(worker) for _ in range(args.concurrency)]
+        measured = [(status, latency) for future in futures for _, status, latency in future.result()]
+    elapsed = time.perf_counter() - begin
+
+    statuses = {}
+    for status, _ in measured:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = {
+        "url": args.url,
+        "requests": len(measured),
+        "concurrency": args.concurrency,
+        "status_codes": statuses,
+        "errors": sum(count for status, count in statuses.items() if status != "200"),
+        "throughput_rps": len(measured) / elapsed,
+        **percentiles([latency for status, latency in measured if status == 200])
+    }
+    print(f"⏱️  http: {result['throughput_rps']:.1f} 次/秒  p50 {result.get('p50_ms', 0):.1f}ms  "
+          f"p95 {result.get('p95_ms', 0):.1f}ms  p99 {result.get('p99_ms', 0):.1f}ms  错误 {result['errors']}")
+    return result
+
+
+def compare(args):
+    """对比两次结果中的 p50 / p95 延迟，变慢超过容差即视为回归"""
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    def rows(report):
+        for section in ("forward", "predict", "http"):
+            value = report.get(section)
+            if isinstance(value, list):
+                for row in value:
+                    yield f"{section}[threads={row['threads']},batch={row['batch_size']}]", row
+            elif isinstance(value, dict):
+                yield section, value
+
+    baseline_rows = dict(rows(baseline))
+    regressions = []
+    for key, row in rows(current):
+        old = baseline_rows.get(key)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if metric not in row or not old.get(metric):
+                continue
+            change = row[metric] / old[metric] - 1
+            marker = "❌" if change > args.tolerance else "✅"
+            print(f"{marker} {key:<36} {metric:<7} {old[metric]:9.2f} → {row[metric]:9.2f}ms ({change:+.1%})")
+            if change > args.tolerance:
+                regressions.append({"case": key, "metric": metric, "baseline": old[metric],
+                                    "current": row[metric], "change": change})
+    if regressions:
+        print(f"❌ 发现 {len(regressions)} 项性能回归（容差 {args.tolerance:.0%}）")
+        sys.exit(1)
+    print("✅ 未发现性能回归")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="青芜识界基准测试套件")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("--warmup", type=int, default=3)
+        sub.add_argument("--output", help="结果输出路径（JSON），默认打印到标准输出")
+
+    def add_model(sub):
+        sub.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+        sub.add_argument("--num-classes", type=int, default=44)
+        sub.add_argument("--fuse", action="store_true", help="使用推理融合后的模型")
+        sub.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()],
+                         help="torch intra-op 线程数（forward 可传多个）")
+
+    forward = subparsers.add_parser("forward", help="BryoFormer 原始前向延迟")
+    add_common(forward)
+    add_model(forward)
+    forward.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    forward.add_argument("--repeats", type=int, default=20)
+
+    predict = subparsers.add_parser("predict", help="PlantRecognitionModel.predict 端到端延迟")
+    add_common(predict)
+    add_model(predict)
+    predict.add_argument("--images", help="图片目录，默认使用合成图片")
+    predict.add_argument("--requests", type=int, default=200)
+    predict.add_argument("--concurrency", type=int, default=8)
+    predict.add_argument("--max-batch-size", type=int, default=8)
+    predict.add_argument("--preprocess-workers", type=int, default=2)
+    predict.add_argument("--fast-preprocess", action="store_true")
+
+    http_parser = subparsers.add_parser("http", help="/api/identify 吞吐与延迟分位数")
+    add_common(http_parser)
+    http_parser.add_argument("--url", default="http://localhost:8000")
+    http_parser.add_argument("--images", help="图片目录，默认使用合成图片")
+    http_parser.add_argument("--requests", type=int, default=500)
+    http_parser.add_argument("--concurrency", type=int, default=16)
+    http_parser.add_argument("--timeout", type=float, default=30.0)
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次基准结果")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1, help="允许的延迟增长比例")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+        return
+
+    report = {"environment": environment(), "config": {k: v for k, v in vars(args).items() if k != "output"}}
+    if args.command == "forward":
+        report["forward"] = bench_forward(args)
+    elif args.command == "predict":
+        report["predict"] = bench_predict(args)
+    else:
+        report["http"] = bench_http(args)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 结果已保存: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""构建 / 增量更新参考图片向量索引，供 /api/identify?similar=k 返回视觉相似的参考照片
+
+参考图片目录按类别分子目录，子目录名为类别编号（与类别映射中的键一致）:
+    references/
+        0/xxx.jpg
+        1/yyy.jpg
+
+用法:
+    python -m backend.tools.build_index --references path/to/references \
+        --index backend/models/weights/reference_index --weights backend/models/weights/epoch_35_best.pth
+
+再次运行时只为新增图片提取特征并追加到已有索引，无需重建；--retrain 会重新训练聚类中心。
+"""
+import argparse
+import os
+
+import torch
+
+from backend.models.plant_model import PlantRecognitionModel
+from backend.models.vector_index import INDEX_FILE, VectorIndex
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def collect_references(root):
+    """返回 (相对路径, 类别编号) 列表"""
+    references = []
+    for class_dir in sorted(os.listdir(root)):
+        class_path = os.path.join(root, class_dir)
+        if not os.path.isdir(class_path) or not class_dir.isdigit():
+            continue
+        for name in sorted(os.listdir(class_path)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                references.append((f"{class_dir}/{name}", int(class_dir)))
+    return references
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建参考图片向量索引")
+    parser.add_argument("--references", required=True, help="参考图片目录（按类别编号分子目录）")
+    parser.add_argument("--index", default="models/weights/reference_index", help="索引目录")
+    parser.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--num-classes", type=int, default=44)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--nlist", type=int, default=64, help="IVF 倒排列表数")
+    parser.add_argument("--nprobe", type=int, default=8, help="检索时访问的倒排列表数")
+    parser.add_argument("--retrain", action="store_true", help="重新训练聚类中心")
+    args = parser.parse_args()
+
+    recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"))
+    if not recognizer.supports_embeddings:
+        raise SystemExit("❌ 当前模型不支持特征提取")
+
+    if os.path.exists(os.path.join(args.index, INDEX_FILE)):
+        index = VectorIndex.load(args.index, mmap=True)
+        if index.model_version != recognizer.model_version:
+            raise SystemExit("❌ 已有索引由其他版本的模型权重生成，请删除索引目录后重新构建")
+        print(f"🗂️  已加载索引: {index.count} 张")
+    else:
+        # 特征维度即分类头的输入维度（384）
+        index = VectorIndex(recognizer.model.head.in_features, nlist=args.nlist, nprobe=args.nprobe,
+                            model_version=recognizer.model_version)
+
+    indexed = {item.get("path") for item in index.metadata}
+    pending = [(path, class_id) for path, class_id in collect_references(args.references) if path not in indexed]
+    print(f"📁 新增参考图片: {len(pending)} 张")
+
+    for start in range(0, len(pending), args.batch_size):
+        chunk = pending[start:start + args.batch_size]
+        tensors, metadata = [], []
+        for path, class_id in chunk:
+            try:
+                tensors.append(recognizer.preprocess(os.path.join(args.references, path)))
+                metadata.append({"class_id": class_id, "path": path})
+            except Exception as e:
+                print(f"⚠️  跳过无法解码的图片 {path}: {e}")
+        if tensors:
+            outputs = recognizer.forward_batch(tensors, with_features=True)
+            index.add(torch.stack([embedding for _, embedding in outputs]).numpy(), metadata)
+        print(f"⏳ {min(start + args.batch_size, len(pending))}/{len(pending)}")
+
+    if args.retrain:
+        index.train()
+    index.save(args.index)
+    state = f"IVF, {index.nlist} 个倒排列表" if index.trained else "精确搜索（数量不足，尚未训练聚类中心）"
+    print(f"✅ 索引已保存: {args.index}（共 {index.count} 张, {state}）")
+
+
+if __name__ == "__main__":
+    main()
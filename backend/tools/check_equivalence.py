@@ -0,0 +1,92 @@
+"""推理期改写的数值等价性检查：融合注意力（scaled_dot_product_attention）、BN 折叠与频域滤波的空间卷积实现
+
+每一项都与原始计算路径比较最大绝对误差，任一项超出容差时以非零状态退出，可在升级 torch 或修改模型后运行:
+    python -m backend.tools.check_equivalence --atol 1e-4
+"""
+import argparse
+import sys
+
+import torch
+
+from backend.models.bryoFormer import SDPA_AVAILABLE, BryoFormer, OSRAttention, SpectralGatingNetwork
+
+
+def max_diff(a, b):
+    return (a - b).abs().max().item()
+
+
+@torch.no_grad()
+def check_attention(dim, grid, batch_size):
+    """OSRAttention：融合注意力与显式 softmax(q @ k) @ v，分别在有无 relative_pos_enc 时比较"""
+    attn = OSRAttention(dim=dim, num_heads=6, sr_ratio=2).eval()
+    h, w = grid
+    x = torch.randn(batch_size, dim, h, w)
+    kv_tokens = (h // 2) * (w // 2)
+    results = {}
+    for label, relative_pos_enc in (("no_pos_enc", None),
+                                    ("pos_enc", torch.randn(batch_size, 6, h * w, kv_tokens)),
+                                    ("pos_enc_interpolated", torch.randn(batch_size, 6, 7, 7))):
+        attn.fused_attn = True
+        fused = attn(x, relative_pos_enc)
+        attn.fused_attn = False
+        explicit = attn(x, relative_pos_enc)
+        results[f"attention/{label}"] = max_diff(fused, explicit)
+    return results
+
+
+@torch.no_grad()
+def check_model(batch_size):
+    """整模型：融合注意力开关、BN 折叠（fuse_for_inference）与 conv 频域滤波策略"""
+    model = BryoFormer(embed_dim=384, depth=8, mlp_ratio=2.).eval()
+    x = torch.randn(batch_size, 3, 224, 224)
+    reference = model(x)
+    results = {}
+
+    for module in model.modules():
+        if isinstance(module, OSRAttention):
+            module.fused_attn = False
+    explicit = model(x)
+    for module in model.modules():
+        if isinstance(module, OSRAttention):
+            module.fused_attn = SDPA_AVAILABLE
+    results["model/fused_attention"] = max_diff(reference, explicit)
+
+    results["model/fuse_for_inference"] = max_diff(reference, model.fuse_for_inference(verify=False)(x))
+
+    model.set_spectral_strategy("conv")
+    results["model/spectral_conv"] = max_diff(reference, model(x))
+    model.set_spectral_strategy("fft")
+
+    # 关闭权重缓存的 fft 路径（训练时的计算方式）
+    for module in model.modules():
+        if isinstance(module, SpectralGatingNetwork):
+            module.cache_weight = False
+    results["model/spectral_uncached"] = max_diff(reference, model(x))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BryoFormer 推理期改写的数值等价性检查")
+    parser.add_argument("--atol", type=float, default=1e-4, help="允许的最大绝对误差")
+    parser.add_argument("--batch-size", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    if not SDPA_AVAILABLE:
+        print(f"⚠️  torch {torch.__version__} 不支持带 scale 参数的 scaled_dot_product_attention，融合注意力已关闭")
+
+    results = {**check_attention(384, (14, 14), args.batch_size), **check_model(args.batch_size)}
+    failed = False
+    for name, diff in results.items():
+        ok = diff <= args.atol
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {name:<32} 最大误差 {diff:.2e}")
+    if failed:
+        print(f"❌ 存在超出容差 {args.atol:.0e} 的差异")
+        sys.exit(1)
+    print("✅ 全部等价")
+
+
+if __name__ == "__main__":
+    main()
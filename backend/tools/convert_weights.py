@@ -0,0 +1,51 @@
+"""将训练检查点转换为快速权重格式（仅含张量、键名已去前缀、可内存映射）
+
+用法:
+    python -m backend.tools.convert_weights --input backend/models/weights/epoch_35_best.pth \
+        --output backend/models/weights/bryoformer.weights.pt
+
+转换后的文件可直接作为 PlantRecognitionModel 的 model_path 使用：
+加载时通过 mmap 映射到页缓存，不反序列化优化器状态，也不再复制一份去前缀的 state_dict。
+"""
+import argparse
+import os
+
+import torch
+
+from backend.models.bryoFormer import BryoFormer
+from backend.models.checkpoint import extract_state_dict, load_checkpoint
+from backend.models.plant_model import FAST_WEIGHTS_SUFFIX
+
+
+def owns_storage(tensor):
+    """张量是否独占其底层存储（偏移为 0 且存储大小正好等于张量大小）"""
+    return (tensor.storage_offset() == 0
+            and tensor.untyped_storage().nbytes() == tensor.numel() * tensor.element_size())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="转换 BryoFormer 检查点为快速权重格式")
+    parser.add_argument("--input", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--output", default=f"models/weights/bryoformer{FAST_WEIGHTS_SUFFIX}")
+    parser.add_argument("--num-classes", type=int, default=44)
+    args = parser.parse_args()
+
+    if not args.output.endswith(FAST_WEIGHTS_SUFFIX):
+        raise SystemExit(f"❌ 输出文件名必须以 {FAST_WEIGHTS_SUFFIX} 结尾")
+
+    print(f"📥 读取检查点: {args.input}")
+    state_dict = extract_state_dict(load_checkpoint(args.input))
+
+    # 严格校验键名与形状，确保加载端可以使用 strict=True
+    model = BryoFormer(num_classes=args.num_classes, embed_dim=384, depth=8, mlp_ratio=2.)
+    model.load_state_dict(state_dict, strict=True)
+
+    # 与其他张量共享存储的视图（如整模型 pickle 中的切片）会把整块存储写进文件，单独复制一份
+    state_dict = {k: v if owns_storage(v) else v.clone() for k, v in state_dict.items()}
+    torch.save(state_dict, args.output)
+    size_mb = os.path.getsize(args.output) / 1024 / 1024
+    print(f"✅ 已写入快速权重: {args.output} ({len(state_dict)} 个张量, {size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""早退辅助头：训练（主干冻结，以完整模型的输出做自蒸馏）与准确率 / 延迟权衡曲线
+
+用法:
+    # 在第 2、4 个频域 Block 之后训练辅助头（图片目录格式同 quantization_report，可以没有标签）
+    python -m backend.tools.early_exit train --weights backend/models/weights/epoch_35_best.pth \
+        --images path/to/train --blocks 1 3 --output backend/models/weights/exit_heads.pth
+
+    # 在验证集上扫描置信度阈值，输出各阈值下的准确率、与完整模型的一致率、延迟与早退比例
+    python -m backend.tools.early_exit report --weights backend/models/weights/epoch_35_best.pth \
+        --exit-heads backend/models/weights/exit_heads.pth --images path/to/holdout --output early_exit.json
+
+服务端通过 PLANT_EXIT_HEADS / PLANT_EARLY_EXIT_THRESHOLD 启用，运行时可用 PUT /debug/early-exit 调整阈值。
+"""
+import argparse
+import json
+import statistics
+import time
+
+import torch
+import torch.nn.functional as F
+
+from backend.models.bryoFormer import DEFAULT_EXIT_BLOCKS
+from backend.models.plant_model import PlantRecognitionModel
+from backend.tools.quantization_report import collect_images
+
+
+def load_samples(recognizer, image_dir):
+    samples = collect_images(image_dir, recognizer.class_names)
+    if not samples:
+        raise SystemExit(f"❌ 未在 {image_dir} 中找到图片")
+    print(f"📸 图片: {len(samples)} 张（带标签 {sum(label is not None for _, label in samples)} 张）")
+    tensors = [recognizer.preprocess(path) for path, _ in samples]
+    labels = [label for _, label in samples]
+    return tensors, labels
+
+
+@torch.no_grad()
+def collect_features(model, tensors, batch_size):
+    """完整前向一次：收集每个辅助头位置的池化 token 与最终 logits（自蒸馏的教师输出）"""
+    pooled = {key: [] for key in model.exit_heads}
+    handles = []
+    for key in model.exit_heads:
+        def hook(module, inputs, output, key=key):
+            pooled[key].append(output.mean(1))
+        handles.append(model.blocks[int(key)].register_forward_hook(hook))
+    try:
+        teacher = []
+        for start in range(0, len(tensors), batch_size):
+            batch = torch.stack(tensors[start:start + batch_size])
+            teacher.append(model.head(model.final_dropout(model.forward_features(batch))))
+    finally:
+        for handle in handles:
+            handle.remove()
+    return {key: torch.cat(values) for key, values in pooled.items()}, torch.cat(teacher)
+
+
+def train_head(head, pooled, teacher, labels, epochs, lr, batch_size, temperature):
+    """在缓存的池化特征上训练单个辅助头：KL 蒸馏教师分布，带标签的样本额外计交叉熵"""
+    optimizer = torch.optim.AdamW(head.parameters(), lr=lr, weight_decay=0.01)
+    soft_targets = (teacher / temperature).softmax(dim=1)
+    head.train()
+    for epoch in range(epochs):
+        order = torch.randperm(len(pooled))
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            logits = head.classify(pooled[index])
+            loss = F.kl_div(F.log_softmax(logits / temperature, dim=1), soft_targets[index],
+                            reduction="batchmean") * temperature ** 2
+            labeled = labels[index] >= 0
+            if labeled.any():
+                loss = loss + F.cross_entropy(logits[labeled], labels[index][labeled])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(index)
+        if epoch == 0 or (epoch + 1) % 10 == 0 or epoch + 1 == epochs:
+            print(f"⏳ epoch {epoch + 1}/{epochs}: loss {total / len(order):.4f}")
+    head.eval()
+    with torch.no_grad():
+        return (head.classify(pooled).argmax(1) == teacher.argmax(1)).float().mean().item()
+
+
+def train(args):
+    recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"))
+    model = recognizer.model
+    if not hasattr(model, "add_exit_heads"):
+        raise SystemExit("❌ 当前模型不支持早退辅助头")
+    model.add_exit_heads(args.blocks)
+
+    tensors, labels = load_samples(recognizer, args.images)
+    labels = torch.tensor([-1 if label is None or label >= args.num_classes else label for label in labels])
+    pooled, teacher = collect_features(model, tensors, args.batch_size)
+
+    for key, head in model.exit_heads.items():
+        print(f"🎯 训练 block {key} 之后的辅助头")
+        agreement = train_head(head, pooled[key], teacher, labels, args.epochs, args.lr, args.batch_size,
+                               args.temperature)
+        print(f"✅ block {key}: 训练集上与完整模型 top-1 一致率 {agreement:.2%}")
+
+    torch.save(model.exit_heads.state_dict(), args.output)
+    print(f"✅ 辅助头已保存: {args.output}")
+
+
+def evaluate(recognizer, tensors, threshold, batch_size, repeats):
+    """按阈值执行早退推理，返回每个样本的 top-1 类别、逐批次延迟（毫秒）与各退出位置占比"""
+    recognizer.set_exit_threshold(threshold)
+    predictions = []
+    latencies = []
+    for start in range(0, len(tensors), batch_size):
+        batch = tensors[start:start + batch_size]
+        recognizer.forward_batch(batch)  # 预热
+        for _ in range(repeats):
+            begin = time.perf_counter()
+            probabilities = recognizer.forward_batch(batch)
+            latencies.append((time.perf_counter() - begin) * 1000 / len(batch))
+        predictions.extend(int(p.argmax()) for p in probabilities)
+    return predictions, latencies, recognizer.early_exit_stats()["exit_rate"]
+
+
+def report(args):
+    recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"),
+                                       fuse=args.fuse, exit_heads_path=args.exit_heads)
+    if not recognizer.supports_early_exit:
+        raise SystemExit(f"❌ 未能加载早退辅助头: {args.exit_heads}")
+
+    tensors, labels = load_samples(recognizer, args.images)
+    labeled = [index for index, label in enumerate(labels) if label is not None]
+
+    full_preds, full_latencies, _ = evaluate(recognizer, tensors, 0.0, args.batch_size, args.repeats)
+    full_ms = statistics.mean(full_latencies)
+
+    def summarize(threshold, predictions, latencies, exit_rate):
+        mean_ms = statistics.mean(latencies)
+        return {
+            "threshold": threshold,
+            "accuracy": (sum(predictions[i] == labels[i] for i in labeled) / len(labeled)) if labeled else None,
+            "agreement_with_full": sum(a == b for a, b in zip(predictions, full_preds)) / len(tensors),
+            "latency_ms_per_image_mean": mean_ms,
+            "latency_ms_per_image_p50": statistics.median(latencies),
+            "speedup": full_ms / mean_ms,
+            "exit_rate": exit_rate
+        }
+
+    full = summarize(0.0, full_preds, full_latencies, {"final": 1.0})
+    curve = []
+    for threshold in sorted(args.thresholds, reverse=True):
+        point = summarize(threshold, *evaluate(recognizer, tensors, threshold, args.batch_size, args.repeats))
+        curve.append(point)
+        early = 1.0 - point["exit_rate"].get("final", 0.0)
+        accuracy = f"准确率 {point['accuracy']:.2%}, " if point["accuracy"] is not None else ""
+        print(f"📈 阈值 {threshold:.2f}: {accuracy}与完整模型一致率 {point['agreement_with_full']:.2%}, "
+              f"延迟 {point['latency_ms_per_image_mean']:.2f}ms/张 (x{point['speedup']:.2f}), 早退 {early:.0%}")
+
+    result = {
+        "images": len(tensors),
+        "labeled_images": len(labeled),
+        "batch_size": args.batch_size,
+        "torch_threads": torch.get_num_threads(),
+        "exit_blocks": recognizer.early_exit_stats()["exit_blocks"],
+        "full": full,
+        "curve": curve
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 报告已保存: {args.output}")
+    else:
+        print(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BryoFormer 早退辅助头训练与权衡报告")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+        sub.add_argument("--images", required=True, help="图片目录（类别编号或类别名称命名的子目录视为带标签）")
+        sub.add_argument("--num-classes", type=int, default=44)
+        sub.add_argument("--threads", type=int, default=0, help="torch intra-op 线程数，0 表示默认")
+
+    train_parser = subparsers.add_parser("train", help="训练早退辅助头")
+    add_common(train_parser)
+    train_parser.add_argument("--blocks", type=int, nargs="+", default=list(DEFAULT_EXIT_BLOCKS),
+                              help="在这些编号的 block 之后放置辅助头（0-3 为频域 Block，4 为 FreqTimeBridge）")
+    train_parser.add_argument("--epochs", type=int, default=30)
+    train_parser.add_argument("--lr", type=float, default=1e-3)
+    train_parser.add_argument("--batch-size", type=int, default=32)
+    train_parser.add_argument("--temperature", type=float, default=2.0, help="蒸馏温度")
+    train_parser.add_argument("--output", default="models/weights/exit_heads.pth")
+    train_parser.set_defaults(handler=train)
+
+    report_parser = subparsers.add_parser("report", help="各置信度阈值下的准确率 / 延迟权衡曲线")
+    add_common(report_parser)
+    report_parser.add_argument("--exit-heads", default="models/weights/exit_heads.pth")
+    report_parser.add_argument("--thresholds", type=float, nargs="+",
+                               default=[0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99])
+    report_parser.add_argument("--batch-size", type=int, default=1, help="默认逐张推理，对应线上单图请求")
+    report_parser.add_argument("--repeats", type=int, default=3)
+    report_parser.add_argument("--fuse", action="store_true", help="与线上一致，折叠 BatchNorm 后测量")
+    report_parser.add_argument("--output", help="报告输出路径（JSON），默认打印到标准输出")
+    report_parser.set_defaults(handler=report)
+
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""将 BryoFormer 导出为 ONNX，并与 PyTorch eager 模型做 logits 一致性校验
+
+用法:
+    python -m backend.tools.export_onnx --weights backend/models/weights/epoch_35_best.pth \
+        --output backend/models/weights/bryoformer.onnx
+
+SpectralGatingNetwork 中的 torch.fft.rfft2 / irfft2 需要 opset >= 17 的 DFT 算子，
+因此使用基于 torch.export 的导出器（需要安装 onnx、onnxscript 和 onnxruntime）。
+"""
+import argparse
+import sys
+
+import numpy as np
+import torch
+
+from backend.models.plant_model import PlantRecognitionModel
+from backend.models.onnx_backend import OnnxRunner
+
+
+def export(model, output_path, opset_version=18):
+    """导出支持动态批大小的 ONNX 模型"""
+    dummy = torch.randn(2, 3, 224, 224)
+    batch = torch.export.Dim("batch", min=1, max=1024)
+    torch.onnx.export(
+        model,
+        (dummy,),
+        output_path,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_shapes={"x": {0: batch}},
+        opset_version=opset_version,
+        dynamo=True
+    )
+
+
+def check_parity(model, onnx_path, batch_sizes, atol):
+    """比较 eager 与 ONNX Runtime 的 logits，返回各批大小下的最大绝对误差"""
+    runner = OnnxRunner(onnx_path)
+    errors = {}
+    for batch_size in batch_sizes:
+        inputs = torch.randn(batch_size, 3, 224, 224)
+        with torch.no_grad():
+            expected = model(inputs).numpy()
+        actual = runner(inputs.numpy())
+        errors[batch_size] = float(np.abs(expected - actual).max())
+        status = "✅" if errors[batch_size] <= atol else "❌"
+        print(f"{status} batch={batch_size} 最大绝对误差: {errors[batch_size]:.2e}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 BryoFormer ONNX 模型")
+    parser.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--output", default="models/weights/bryoformer.onnx")
+    parser.add_argument("--num-classes", type=int, default=44)
+    parser.add_argument("--opset", type=int, default=18)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"))
+    model = recognizer.model
+
+    print(f"📦 导出 ONNX 模型: {args.output}")
+    export(model, args.output, args.opset)
+
+    errors = check_parity(model, args.output, args.batch_sizes, args.atol)
+    if max(errors.values()) > args.atol:
+        print(f"❌ ONNX 与 PyTorch 输出不一致（容差 {args.atol}）")
+        sys.exit(1)
+    print("🎉 ONNX 导出完成，一致性校验通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""负载生成器：按真实移动端流量特征回放图片目录，按时间窗口报告吞吐、错误率与延迟分位数
+
+请求格式与 Frontend/main.py 中 PlantAPIClient.identify_plant 一致（multipart 字段 file + 文件名），
+既可压测真实后端（backend/main.py），也可对 backend/test_server.py 压测得到客户端侧基线。
+
+用法:
+    # 开环：平均 20 次/秒的泊松到达，30% 重复图片，小/中/大图按 5:3:2 混合
+    python -m backend.tools.loadgen --url http://localhost:8000 --images path/to/photos \
+        --rate 20 --arrival poisson --duplicate-ratio 0.3 --size-mix small:5,medium:3,large:2 \
+        --duration 60 --output load.json
+
+    # 闭环：16 个并发客户端不间断发送
+    python -m backend.tools.loadgen --url http://localhost:8000 --images path/to/photos --concurrency 16
+"""
+import argparse
+import asyncio
+import io
+import json
+import mimetypes
+import os
+import random
+import time
+
+from PIL import Image
+
+try:
+    import aiohttp
+
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# 图片尺寸档位：长边像素数（None 表示原图）
+SIZE_PRESETS = {"small": 640, "medium": 1600, "large": 4000, "original": None}
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(records, elapsed):
+    """records: (延迟毫秒, 状态) 列表；状态为 HTTP 状态码或异常类型名"""
+    latencies = sorted(latency for latency, status in records if status == 200)
+    statuses = {}
+    for _, status in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = len(records) - len(latencies)
+    return {
+        "completed": len(records),
+        "throughput_rps": len(records) / elapsed if elapsed > 0 else 0.0,
+        "error_rate": errors / len(records) if records else 0.0,
+        "status_codes": statuses,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": latencies[-1] if latencies else None
+    }
+
+
+def parse_size_mix(text):
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        if name not in SIZE_PRESETS:
+            raise SystemExit(f"❌ 未知尺寸档位: {name}（可选 {', '.join(SIZE_PRESETS)}）")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def resize_variant(content, long_edge):
+    """按长边缩放并重新编码为 JPEG，模拟不同机型 / 压缩设置的上传"""
+    if long_edge is None:
+        return content
+    with Image.open(io.BytesIO(content)) as image:
+        image = image.convert("RGB")
+        scale = long_edge / max(image.size)
+        if scale < 1:
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.BILINEAR)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def load_payloads(directory, size_mix):
+    """预先生成每张图片在各尺寸档位下的字节，避免压测过程中客户端自身成为瓶颈"""
+    names = sorted(name for name in os.listdir(directory)
+                   if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    if not names:
+        raise SystemExit(f"❌ 未在 {directory} 中找到图片")
+
+    payloads = {size: [] for size in size_mix}
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            content = f.read()
+        for size in size_mix:
+            variant = resize_variant(content, SIZE_PRESETS[size])
+            filename = name if SIZE_PRESETS[size] is None else os.path.splitext(name)[0] + ".jpg"
+            payloads[size].append((filename, variant))
+    print(f"📁 已加载 {len(names)} 张图片, 尺寸档位: {', '.join(size_mix)}")
+    return payloads
+
+
+class TrafficModel:
+    """生成每个请求的图片：按尺寸档位加权抽样，并按比例重复发送已发送过的图片"""
+
+    def __init__(self, payloads, size_mix, duplicate_ratio, seed):
+        self.payloads = payloads
+        self.sizes = list(size_mix)
+        self.weights = [size_mix[size] for size in self.sizes]
+        self.duplicate_ratio = duplicate_ratio
+        self.rng = random.Random(seed)
+        self.sent = []
+
+    def next_request(self):
+        if self.sent and self.rng.random() < self.duplicate_ratio:
+            return self.rng.choice(self.sent)
+        size = self.rng.choices(self.sizes, self.weights)[0]
+        filename, content = self.rng.choice(self.payloads[size])
+        # 在 JPEG/PNG 结束标记后追加随机字节，使内容哈希唯一（不影响解码）
+        content = content + self.rng.randbytes(16)
+        request = (filename, content)
+        self.sent.append(request)
+        if len(self.sent) > 1000:
+            self.sent.pop(self.rng.randrange(len(self.sent)))
+        return request
+
+    def arrival_gaps(self, arrival, rate, burst_size):
+        """请求间隔（秒）：constant 匀速、poisson 指数分布、bursty 按突发成批到达"""
+        while True:
+            if arrival == "constant":
+                yield 1.0 / rate
+            elif arrival == "poisson":
+                yield self.rng.expovariate(rate)
+            else:
+                # 突发之间的间隔服从均值为 burst_size / rate 的指数分布，长期平均速率仍为 rate
+                yield self.rng.expovariate(rate / burst_size)
+                for _ in range(burst_size - 1):
+                    yield 0.0
+
+
+class Recorder:
+    """收集请求结果，并按固定时间窗口输出报告"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.window_started = self.started
+        self.records = []
+        self.window = []
+        self.windows = []
+        self.in_flight = 0
+
+    def record(self, latency_ms, status):
+        self.records.append((latency_ms, status))
+        self.window.append((latency_ms, status))
+
+    def flush(self):
+        now = time.perf_counter()
+        window, self.window = self.window, []
+        stats = summarize(window, now - self.window_started)
+        self.window_started = now
+        stats["t"] = round(now - self.started, 1)
+        stats["in_flight"] = self.in_flight
+        self.windows.append(stats)
+        p50 = f"{stats['p50_ms']:.0f}" if stats["p50_ms"] is not None else "-"
+        p99 = f"{stats['p99_ms']:.0f}" if stats["p99_ms"] is not None else "-"
+        print(f"⏱️  t={stats['t']:>6.1f}s  {stats['throughput_rps']:6.1f} 次/秒  错误率 {stats['error_rate']:5.1%}  "
+              f"p50 {p50:>5}ms  p99 {p99:>5}ms  进行中 {self.in_flight}")
+
+    async def report_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+
+async def send(session, url, recorder, request, scheduled):
+    """发送一次识别请求；延迟从计划发送时间算起，包含客户端排队，避免协调遗漏"""
+    filename, content = request
+    form = aiohttp.FormData()
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    form.add_field("file", content, filename=filename, content_type=content_type)
+    recorder.in_flight += 1
+    try:
+        async with session.post(f"{url}/api/identify", data=form) as response:
+            await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        status = type(e).__name__
+    finally:
+        recorder.in_flight -= 1
+    recorder.record((time.perf_counter() - scheduled) * 1000, status)
+
+
+async def open_loop(args, session, traffic, recorder, deadline):
+    """开环：按到达过程发送，不等待前一个请求完成（并发上限由 --concurrency 限制）"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    tasks = []
+    next_time = time.perf_counter()
+
+    async def guarded(request, scheduled):
+        async with semaphore:
+            await send(session, args.url, recorder, request, scheduled)
+
+    for gap in traffic.arrival_gaps(args.arrival, args.rate, args.burst_size):
+        next_time += gap
+        if next_time >= deadline or (args.requests and len(tasks) >= args.requests):
+            break
+        delay = next_time - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(guarded(traffic.next_request(), next_time)))
+    await asyncio.gather(*tasks)
+
+
+async def closed_loop(args, session, traffic, recorder, deadline):
+    """闭环：concurrency 个客户端各自发送完一个请求后立即发送下一个"""
+    sent = 0
+
+    async def client():
+        nonlocal sent
+        while time.perf_counter() < deadline and not (args.requests and sent >= args.requests):
+            sent += 1
+            await send(session, args.url, recorder, traffic.next_request(), time.perf_counter())
+
+    await asyncio.gather(*[client() for _ in range(args.concurrency)])
+
+
+async def run(args):
+    size_mix = parse_size_mix(args.size_mix)
+    traffic = TrafficModel(load_payloads(args.images, size_mix), size_mix, args.duplicate_ratio, args.seed)
+    recorder = Recorder(args.interval)
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        mode = f"开环 {args.arrival} {args.rate} 次/秒" if args.rate > 0 else "闭环"
+        print(f"🚀 开始压测 {args.url}（{mode}, 并发上限 {args.concurrency}, 时长 {args.duration}s）")
+        reporter = asyncio.create_task(recorder.report_loop())
+        started = time.perf_counter()
+        deadline = started + args.duration
+        try:
+            if args.rate > 0:
+                await open_loop(args, session, traffic, recorder, deadline)
+            else:
+                await closed_loop(args, session, traffic, recorder, deadline)
+        finally:
+            reporter.cancel()
+        elapsed = time.perf_counter() - started
+        if recorder.window:
+            recorder.flush()
+
+    summary = summarize(recorder.records, elapsed)
+    print(f"✅ 完成 {summary['completed']} 次请求, {summary['throughput_rps']:.1f} 次/秒, "
+          f"错误率 {summary['error_rate']:.1%}, p50 {summary['p50_ms'] or 0:.0f}ms, "
+          f"p95 {summary['p95_ms'] or 0:.0f}ms, p99 {summary['p99_ms'] or 0:.0f}ms")
+    return {"config": vars(args), "summary": summary, "windows": recorder.windows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="青芜识界负载生成器")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--images", required=True, help="回放的图片目录")
+    parser.add_argument("--concurrency", type=int, default=16, help="最大并发请求数（闭环模式下为客户端数）")
+    parser.add_argument("--rate", type=float, default=0.0, help="平均到达速率（次/秒），0 表示闭环模式")
+    parser.add_argument("--arrival", choices=["poisson", "bursty", "constant"], default="poisson")
+    parser.add_argument("--burst-size", type=int, default=10, help="bursty 模式下每次突发的请求数")
+    parser.add_argument("--size-mix", default="original:1", help="尺寸档位权重，如 small:5,medium:3,large:2")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="重复发送已发送图片的比例")
+    parser.add_argument("--duration", type=float, default=60.0, help="压测时长（秒）")
+    parser.add_argument("--requests", type=int, default=0, help="最多发送的请求数，0 表示只受时长限制")
+    parser.add_argument("--interval", type=float, default=5.0, help="报告窗口（秒）")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果输出路径（JSON）")
+    args = parser.parse_args()
+
+    if not AIOHTTP_AVAILABLE:
+        raise SystemExit("❌ 未安装 aiohttp，请先 pip install aiohttp")
+    args.url = args.url.rstrip("/")
+    args.burst_size = max(1, args.burst_size)
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""逐层性能剖析：统计 BryoFormer 每个 block 及其子模块的耗时占比、FLOPs 估算与激活内存
+
+用法:
+    python -m backend.tools.profile_blocks --weights backend/models/weights/epoch_35_best.pth \
+        --batch-size 8 --forwards 20 --threads 4
+"""
+import argparse
+import json
+
+import torch
+
+from backend.models.plant_model import PlantRecognitionModel
+
+
+def print_report(report):
+    print(f"📊 {report['forwards']} 次前向, 平均 {report['ms_per_forward']:.2f}ms/次")
+    print(f"{'模块':<28} {'类型':<24} {'ms/次':>8} {'占比':>7} {'GFLOPs':>8} {'激活MB':>8}")
+    for row in report["modules"]:
+        name = "  " * (row["depth"] - 1) + row["name"]
+        print(f"{name:<28} {row['type']:<24} {row['ms_per_forward']:>8.2f} {row['share']:>7.1%} "
+              f"{row['gflops_per_forward']:>8.3f} {row['activation_mb_per_forward']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BryoFormer 逐层性能剖析")
+    parser.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--num-classes", type=int, default=44)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--forwards", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op 线程数，0 表示默认")
+    parser.add_argument("--fuse", action="store_true", help="剖析推理融合后的模型")
+    parser.add_argument("--spectral-strategy", choices=["fft", "conv", "auto"], default="fft")
+    parser.add_argument("--output", help="结果输出路径（JSON）")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    recognizer = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"),
+                                       fuse=args.fuse, spectral_strategy=args.spectral_strategy)
+    batch = [torch.randn(3, 224, 224) for _ in range(args.batch_size)]
+    recognizer.forward_batch(batch)  # 预热
+
+    recognizer.start_profiling(args.forwards)
+    for _ in range(args.forwards):
+        recognizer.forward_batch(batch)
+    report = recognizer.profile_report()
+    report["batch_size"] = args.batch_size
+    report["torch_threads"] = torch.get_num_threads()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""int8 动态量化对比报告：在验证集上比较 float32 与 int8 模型的准确率、延迟和体积
+
+用法:
+    python -m backend.tools.quantization_report --weights backend/models/weights/epoch_35_best.pth \
+        --images path/to/holdout --output quant_report.json
+
+验证集目录中，以类别编号（如 0、1）或类别名称命名的子目录视为带标签样本；
+其余图片只统计与 float32 模型的 top-1 一致率。
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+import torch
+
+from backend.models.plant_model import PlantRecognitionModel
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def collect_images(image_dir, class_names):
+    """收集验证集图片及其标签（无法识别标签时为 None）"""
+    name_to_id = {info["name"]: int(key) for key, info in class_names.items()}
+    samples = []
+    for root, _, files in os.walk(image_dir):
+        folder = os.path.basename(root)
+        if folder.isdigit():
+            label = int(folder)
+        else:
+            label = name_to_id.get(folder)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                samples.append((os.path.join(root, name), label))
+    return samples
+
+
+def model_size_bytes(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def evaluate(recognizer, tensors, batch_size, repeats):
+    """返回每个样本的 top-1 类别以及逐批次延迟（毫秒）"""
+    predictions = []
+    latencies = []
+    for start in range(0, len(tensors), batch_size):
+        batch = tensors[start:start + batch_size]
+        recognizer.forward_batch(batch)  # 预热
+        for _ in range(repeats):
+            begin = time.perf_counter()
+            probabilities = recognizer.forward_batch(batch)
+            latencies.append((time.perf_counter() - begin) * 1000 / len(batch))
+        predictions.extend(int(p.argmax()) for p in probabilities)
+    return predictions, latencies
+
+
+def summarize(predictions, latencies, labels):
+    labeled = [(p, l) for p, l in zip(predictions, labels) if l is not None]
+    return {
+        "accuracy": sum(p == l for p, l in labeled) / len(labeled) if labeled else None,
+        "latency_ms_per_image_mean": statistics.mean(latencies),
+        "latency_ms_per_image_p50": statistics.median(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BryoFormer int8 动态量化对比报告")
+    parser.add_argument("--weights", default="models/weights/epoch_35_best.pth")
+    parser.add_argument("--images", required=True, help="验证集图片目录")
+    parser.add_argument("--num-classes", type=int, default=44)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op 线程数，0 表示默认")
+    parser.add_argument("--output", help="报告输出路径（JSON），默认打印到标准输出")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    float_model = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"))
+    int8_model = PlantRecognitionModel(args.weights, num_classes=args.num_classes, device=torch.device("cpu"),
+                                       quantize=True)
+
+    samples = collect_images(args.images, float_model.class_names)
+    if not samples:
+        raise SystemExit(f"❌ 未在 {args.images} 中找到图片")
+    print(f"📸 验证集图片: {len(samples)} 张")
+
+    tensors = [float_model.preprocess(path) for path, _ in samples]
+    labels = [label for _, label in samples]
+
+    float_preds, float_latencies = evaluate(float_model, tensors, args.batch_size, args.repeats)
+    int8_preds, int8_latencies = evaluate(int8_model, tensors, args.batch_size, args.repeats)
+
+    report = {
+        "images": len(samples),
+        "labeled_images": sum(label is not None for label in labels),
+        "batch_size": args.batch_size,
+        "torch_threads": torch.get_num_threads(),
+        "float32": {**summarize(float_preds, float_latencies, labels),
+                    "model_bytes": model_size_bytes(float_model.model)},
+        "int8": {**summarize(int8_preds, int8_latencies, labels),
+                 "model_bytes": model_size_bytes(int8_model.model)},
+        "top1_agreement": sum(a == b for a, b in zip(float_preds, int8_preds)) / len(samples),
+    }
+    report["speedup"] = (report["float32"]["latency_ms_per_image_mean"]
+                         / report["int8"]["latency_ms_per_image_mean"])
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ 报告已保存: {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
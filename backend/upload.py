@@ -0,0 +1,164 @@
+"""流式上传解析：边接收 multipart 请求体边校验，非图片或超限的上传在缓冲完整请求体之前即被拒绝"""
+import io
+
+from PIL import Image
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+
+# 常见图片格式的文件头魔数
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+
+# 魔数判断所需的最少字节数（WEBP 需要 12 字节）
+SIGNATURE_BYTES = 12
+
+# 读取到这么多字节仍无法解析出图片尺寸时拒绝（JPEG 的 EXIF 段最长约 64KB）
+HEADER_PROBE_BYTES = 256 * 1024
+
+# multipart 边界与各段头部的额外开销上限
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadRejected(Exception):
+    """上传内容不合法或超出限制"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def sniff_format(head):
+    """根据文件头魔数判断图片格式，无法识别时返回 None"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+class ImageUpload:
+    """累积上传的图片字节，尽早完成格式与尺寸校验"""
+
+    def __init__(self, filename, max_bytes, max_pixels):
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.content = bytearray()
+        self.format = None
+        self.size = None
+
+    def feed(self, data):
+        if len(self.content) + len(data) > self.max_bytes:
+            raise UploadRejected(413, f"图片大小超过限制 ({self.max_bytes // (1024 * 1024)}MB)")
+        self.content += data
+        if self.format is None and len(self.content) >= SIGNATURE_BYTES:
+            self._check_format()
+        if self.format is not None and self.size is None:
+            self._probe_size(final=False)
+
+    def finish(self):
+        """请求体接收完毕时做最终校验"""
+        if self.format is None:
+            self._check_format()
+        if self.size is None:
+            self._probe_size(final=True)
+        return self.content
+
+    def _check_format(self):
+        self.format = sniff_format(bytes(self.content[:SIGNATURE_BYTES]))
+        if self.format is None:
+            raise UploadRejected(400, "请上传图片文件 (JPEG, PNG等)")
+
+    def _probe_size(self, final):
+        """只解析文件头获取尺寸，不解码像素"""
+        try:
+            with Image.open(io.BytesIO(self.content)) as image:
+                width, height = image.size
+        except Exception:
+            if final or len(self.content) > HEADER_PROBE_BYTES:
+                raise UploadRejected(400, "无法解析图片文件头")
+            return
+        self.size = (width, height)
+        if width * height > self.max_pixels:
+            raise UploadRejected(413, f"图片像素数超过限制 ({width}x{height} > {self.max_pixels})")
+
+
+async def read_image_upload(request, field="file", max_bytes=20 * 1024 * 1024, max_pixels=64_000_000):
+    """流式读取 multipart 请求中的图片字段，返回 (文件名, 图片字节)"""
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadRejected(400, "请使用 multipart/form-data 上传图片")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadRejected(413, f"图片大小超过限制 ({max_bytes // (1024 * 1024)}MB)")
+
+    state = {"headers": {}, "field": b"", "value": b"", "part": None}
+    uploads = []
+
+    def on_part_begin():
+        state["headers"] = {}
+        state["part"] = None
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = b""
+        state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name", b"").decode("latin-1") != field or uploads:
+            return
+        # 以文件头魔数为准；客户端未声明具体类型（application/octet-stream）时也允许
+        part_type = state["headers"].get(b"content-type", b"application/octet-stream").decode("latin-1")
+        if not part_type.startswith(("image/", "application/octet-stream")):
+            raise UploadRejected(400, "请上传图片文件 (JPEG, PNG等)")
+        filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+        state["part"] = ImageUpload(filename, max_bytes, max_pixels)
+        uploads.append(state["part"])
+
+    def on_part_data(data, start, end):
+        # 其他表单字段的内容直接丢弃，不占用内存
+        if state["part"] is not None:
+            state["part"].feed(data[start:end])
+
+    def on_part_end():
+        state["part"] = None
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+        parser.finalize()
+    except MultipartParseError as e:
+        raise UploadRejected(400, f"multipart 请求体格式错误: {e}")
+
+    if not uploads:
+        raise UploadRejected(400, f"缺少上传文件字段: {field}")
+    upload = uploads[0]
+    return upload.filename, upload.finish()